@@ -5,5 +5,5 @@
 from .country_data import *
 from .data_plotting import rel_reporting_box, rel_reporting_violin, fourier_transform, plot_fft
 from .pca_multi_location import generate_pca_array, generate_pca_df, run_pca, test_normalisation
-from .statistical_tests import single_t_test, weekday_t_tests, kruskal_weekday_test
+from .statistical_tests import single_t_test, weekday_t_tests, location_weekday_t_tests, kruskal_weekday_test
 from .statistical_tests import multiple_comparisons_correction, wilcoxon_signed_rank_test
\ No newline at end of file
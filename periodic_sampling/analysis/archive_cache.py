@@ -0,0 +1,132 @@
+#
+# Columnar on-disk cache of the JHU daily report archive
+#
+
+import json
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+
+CACHE_VERSION = 1  # Increase whenever the layout of the partitions changes
+
+
+def _save_partition(path, df):
+    """Writes a dataframe as one array per column. Text columns are stored
+    as fixed-width strings with a separate mask of missing values."""
+    arrays = {'__columns__': np.array(df.columns, dtype=str)}
+    for i, column in enumerate(df.columns):
+        values = df[column]
+        if pd.api.types.is_numeric_dtype(values):
+            arrays[f"c{i}"] = values.to_numpy(dtype=float)
+        else:
+            missing = values.isna().to_numpy()
+            arrays[f"c{i}"] = values.fillna('').to_numpy(dtype=str)
+            arrays[f"m{i}"] = missing
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(path + '.tmp', path)
+
+def _column(partition, index, rows=slice(None)):
+    """Reads the selected rows of a single column of an open partition."""
+    values = partition[f"c{index}"][rows]
+    if f"m{index}" in partition.files:
+        values = values.astype(object)
+        values[partition[f"m{index}"][rows]] = np.nan
+    return values
+
+def read_partition(path, location_column=None, locations=None):
+    """Reads a partition written by `update_cache`. If locations are given,
+    the location column is read first, and the remaining columns are only
+    converted for the matching rows.
+
+    Parameters
+    ----------
+    path : str
+        File of the partition
+    location_column : func
+        Function object that takes the list of columns and returns the name
+        of the column identifying the location of each row (or None)
+    locations : set
+        If this is specified, only rows for these locations are kept
+
+    Returns
+    -------
+    pd.DataFrame : Rows of the partition, or None if it has no location column
+    """
+    with np.load(path) as partition:
+        columns = partition['__columns__'].tolist()
+        rows = slice(None)
+        if location_column is not None:
+            key = location_column(columns)
+            if key is None:
+                return None
+            if locations is not None:
+                rows = pd.Series(_column(partition, columns.index(key))).isin(locations).to_numpy()
+        data = {column: _column(partition, i, rows) for i, column in enumerate(columns)}
+        text = {column: 'str' for i, column in enumerate(columns)
+                if f"m{i}" in partition.files}
+    return pd.DataFrame(data, columns=columns).astype(text)
+
+def _load_manifest(cache_dir):
+    path = os.path.join(cache_dir, 'manifest.json')
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != CACHE_VERSION:
+        return {}
+    return manifest['files']
+
+def _build_partition(input_dir, file, cache_dir, parse):
+    _save_partition(os.path.join(cache_dir, file[:-len('.csv')] + '.npz'),
+                    parse(input_dir, file))
+
+def update_cache(input_dir, cache_dir, files, parse, processes=None):
+    """Brings the cache up to date with the source archive. Only files
+    added or modified (by modification time or size) since the last
+    update are parsed again, in parallel, and partitions for deleted
+    files are removed.
+
+    Parameters
+    ----------
+    input_dir : str
+        Directory containing the daily report files
+    cache_dir : str
+        Directory holding the cache
+    files : list
+        Names of all daily report files in the input directory
+    parse : func
+        Function object that reads a daily report file into a dataframe,
+        called as `parse(input_dir, file)`. Must be defined at module level
+    processes : int
+        Number of worker processes - defaults to the number of CPUs
+
+    Returns
+    -------
+    list : Paths of the partitions, one per file, in the order given
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = _load_manifest(cache_dir)
+    current = {}
+    for file in files:
+        stat = os.stat(os.path.join(input_dir, file))
+        current[file] = {'mtime': stat.st_mtime, 'size': stat.st_size}
+
+    stale = [file for file in files if manifest.get(file) != current[file]
+             or not os.path.isfile(os.path.join(cache_dir, file[:-len('.csv')] + '.npz'))]
+    if stale:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            list(executor.map(_build_partition, repeat(input_dir), stale,
+                              repeat(cache_dir), repeat(parse)))
+    for file in set(manifest) - set(current):
+        path = os.path.join(cache_dir, file[:-len('.csv')] + '.npz')
+        if os.path.isfile(path):
+            os.remove(path)
+
+    if stale or set(manifest) != set(current):
+        with open(os.path.join(cache_dir, 'manifest.json'), 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'files': current}, f)
+    return [os.path.join(cache_dir, file[:-len('.csv')] + '.npz') for file in files]
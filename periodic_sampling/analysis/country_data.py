@@ -4,13 +4,16 @@
 
 import os
 import re
-import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import repeat
+
+from .archive_cache import read_partition, update_cache
 
 
 def sumarise_column(col):
-    if np.issubdtype(col, np.number):
+    if pd.api.types.is_numeric_dtype(col):
         if col.name in ['Confirmed', 'Deaths', 'Recovered', 'Active']:
             return col.sum()
         else:
@@ -19,67 +22,178 @@ def sumarise_column(col):
         return list(col.values)[0]
 
 
-def generate_location_df(input_dir, location_key, sum_country=False):
-    """Generate country-specific df from directory with date-wise
-    csv files containing internationally collated data.
+# Columns read from the daily report files, with their types
+_COUNT_COLUMNS = ['Confirmed', 'Deaths', 'Recovered', 'Active']
+_COLUMN_DTYPES = {'FIPS': 'float64', 'Admin2': 'str', 'Province_State': 'str',
+                  'Country_Region': 'str', 'Last_Update': 'str', 'Lat': 'float64',
+                  'Long_': 'float64', 'Combined_Key': 'str', 'Incident_Rate': 'float64',
+                  'Incidence_Rate': 'float64', 'Case_Fatality_Ratio': 'float64',
+                  'Case-Fatality_Ratio': 'float64', 'Province/State': 'str',
+                  'Country/Region': 'str', 'Last Update': 'str', 'Latitude': 'float64',
+                  'Longitude': 'float64', **{col: 'float64' for col in _COUNT_COLUMNS}}
+# Columns renamed partway through the archive, mapped to their current names
+_RENAMED_COLUMNS = {'Incidence_Rate': 'Incident_Rate',
+                    'Case-Fatality_Ratio': 'Case_Fatality_Ratio'}
+
+
+def _report_files(input_dir):
+    """Names of all daily report files in a directory, in date order."""
+    files = [file for file in os.listdir(input_dir) if file.endswith(".csv")]
+    return sorted(files, key=lambda file: datetime.strptime(file.split(".")[0], '%m-%d-%Y'))
+
+def _location_column(columns, sum_country):
+    """Column identifying the location of each row, or None if the file
+    does not contain location keys of the required type."""
+    if sum_country:
+        return ([c for c in ["Country_Region", "Country/Region"] if c in columns] or [None])[0]
+    if "Combined_Key" in columns:
+        return "Combined_Key"
+    if "Province_State" in columns:
+        return "Province_State"
+    return None
+
+def _parse_report(input_dir, file):
+    """Reads a single daily report file, with rates found under the same
+    column names ('Incident_Rate' and 'Case_Fatality_Ratio') in every file."""
+    df = pd.read_csv(os.path.join(input_dir, file), usecols=lambda col: col in _COLUMN_DTYPES,
+                     dtype=_COLUMN_DTYPES)
+    return df.rename(columns={old: new for old, new in _RENAMED_COLUMNS.items()
+                              if new not in df.columns})
+
+def _select_rows(df, file, sum_country=False, locations=None):
+    """Labels the rows of a daily report file with their location and date,
+    keeping only the requested locations. If `sum_country` is set, rows are
+    combined into one row per country (see `sumarise_column`)."""
+    location_column = _location_column(df.columns, sum_country)
+    if location_column is None:
+        return pd.DataFrame()
+    df['Location'] = df[location_column]
+    if locations is not None:
+        df = df[df['Location'].isin(locations)]
+
+    if sum_country:
+        numeric = df.select_dtypes('number').columns
+        aggregation = {col: ('sum' if col in _COUNT_COLUMNS else 'mean') if col in numeric
+                       else 'first' for col in df.columns if col != 'Location'}
+        df = df.groupby('Location', sort=False).agg(aggregation).reset_index()
+
+    df['Date'] = datetime.strptime(file.split(".")[0], '%m-%d-%Y')
+    return df
+
+def _read_report(input_dir, file, sum_country=False, locations=None):
+    """Reads the rows of a single daily report file, labelled with their
+    location and date. If `sum_country` is set, rows are combined into one
+    row per country (see `sumarise_column`).
+
+    Parameters
+    ----------
+    input_dir : str
+        Directory containing the daily report files
+    file : str
+        Name of the file, in the form 'MM-DD-YYYY.csv'
+    sum_country : bool
+        Whether to combine all rows for each country
+    locations : set
+        If this is specified, only rows for these locations are kept
+
+    Returns
+    -------
+    pd.DataFrame : Rows of the file, with 'Location' and 'Date' columns
     """
-    country_df = pd.DataFrame()
-    for file in os.listdir(input_dir):
-        if not file.endswith(".csv"):
-            continue
-        df = pd.read_csv(input_dir + file)
-        if sum_country:
-            country_code = list(set(["Country_Region", "Country/Region"]) & set(df.columns.values))[0]
-            rows = df[df[country_code] == location_key]
-            row = pd.DataFrame(rows.apply(sumarise_column)).transpose()
-
-        else:
-            try:
-                row = df.loc[df["Combined_Key"] == location_key].copy()
-            except KeyError:
-                if "Province_State" in df.columns.values:
-                    row = df.loc[df["Province_State"] == location_key].copy()
-                else:
-                    continue
-
-        row["Date"] = datetime.strptime(file.split(".")[0], '%m-%d-%Y')
-        country_df = pd.concat(pd.Series([country_df, row]), axis=0)
-
-    # Resolve naming inconsistencies in data
-    try:
-        country_df['Incident_Rate'] = country_df['Incident_Rate'].fillna(country_df['Incidence_Rate'])
-        country_df['Case_Fatality_Ratio'] = country_df['Case_Fatality_Ratio'].fillna(country_df['Case-Fatality_Ratio'])
-        country_df.drop(['Incidence_Rate', 'Case-Fatality_Ratio'], axis=1, inplace=True)
-    except KeyError:
-        pass
+    return _select_rows(_parse_report(input_dir, file), file, sum_country, locations)
+
+def _read_cached_report(path, file, sum_country=False, locations=None):
+    """As `_read_report`, but from the partition of the file in the cache.
+    Only rows for the requested locations are read from the partition."""
+    df = read_partition(path, lambda columns: _location_column(columns, sum_country), locations)
+    if df is None:
+        return pd.DataFrame()
+    return _select_rows(df, file, sum_country, locations)
+
+def load_daily_reports(input_dir, sum_country=False, locations=None, processes=None,
+                       cache_dir=None):
+    """Reads every daily report file in a directory once, in parallel,
+    into a single dataframe.
+
+    If `cache_dir` is given, files are read from a columnar cache of the
+    archive in that directory instead, which is first brought up to date
+    with any files added or modified since it was last used.
+
+    Parameters
+    ----------
+    input_dir : str
+        Directory containing the daily report files
+    sum_country : bool
+        Whether to combine all rows for each country on each date
+    locations : list
+        If this is specified, only rows for these locations are kept
+    processes : int
+        Number of worker processes - defaults to the number of CPUs
+    cache_dir : str
+        Directory of the cache (see `archive_cache`) - if not given,
+        the csv files are read directly
+
+    Returns
+    -------
+    pd.DataFrame : Rows from all files, with 'Location' and 'Date' columns
+    """
+    files = _report_files(input_dir)
+    locations = None if locations is None else set(locations)
+    if cache_dir is not None:
+        paths = update_cache(input_dir, cache_dir, files, _parse_report, processes)
+        frames = [_read_cached_report(path, file, sum_country, locations)
+                  for path, file in zip(paths, files)]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            frames = list(executor.map(_read_report, repeat(input_dir), files,
+                                       repeat(sum_country), repeat(locations)))
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return pd.DataFrame(columns=['Location', 'Date'])
+    return pd.concat(frames, ignore_index=True)
+
+def _clean_location_df(country_df):
+    """Drops columns without any values from the data for a single location."""
+    country_df = country_df.drop(columns='Location')
     country_df.dropna(how='all', axis=1, inplace=True)
-
+    counts = [col for col in _COUNT_COLUMNS if col in country_df.columns]
+    country_df[counts] = country_df[counts].round().astype('Int64')  # Case numbers are integers
     return country_df
 
-def generate_all_df(input_dir, output_dir, countries_only = False, overwrite_files = False):
+def generate_location_df(input_dir, location_key, sum_country=False, processes=None,
+                         cache_dir=None):
+    """Generate country-specific df from directory with date-wise
+    csv files containing internationally collated data.
+    """
+    reports = load_daily_reports(input_dir, sum_country, [location_key], processes, cache_dir)
+    return _clean_location_df(reports.set_index(pd.RangeIndex(len(reports))))
+
+def generate_all_df(input_dir, output_dir, countries_only = False, overwrite_files = False,
+                    processes = None, cache_dir = None):
     """Generates location specific files for all locations found in the
-    first valid file in the directory."""
-    search_index = 0
-    while True:
-        initial_file = os.listdir(input_dir)[search_index]
-        df = pd.read_csv(input_dir + initial_file)
-        if countries_only and "Country_Region" in df.columns:
-            locations = df["Country_Region"].unique()
-        elif "Combined_Key" in df.columns:
-            locations = df["Combined_Key"].unique()
-        elif "Province_State" in df.columns:
-            locations = df["Province_State"].unique()
-        else:
-            search_index += 1
-            continue
-        break
-    
-    for location in locations:
-        output_name = output_dir + re.sub('\W+', '', location) + ".csv"
-        if os.path.isfile(output_name) and not overwrite_files:
-            continue
-        country_df = generate_location_df(input_dir, location, countries_only)
-        country_df.to_csv(output_name)
+    first valid file in the directory. All files are read once (in
+    parallel), and split between locations in a single groupby."""
+    for initial_file in _report_files(input_dir):
+        df = pd.read_csv(os.path.join(input_dir, initial_file), nrows=0)
+        location_column = ("Country_Region" if countries_only and "Country_Region" in df.columns
+                           else _location_column(df.columns, sum_country=False))
+        if location_column is not None:
+            break
+    locations = pd.read_csv(os.path.join(input_dir, initial_file),
+                            usecols=[location_column])[location_column].unique()
+
+    output_names = {location: output_dir + re.sub(r'\W+', '', location) + ".csv"
+                    for location in locations}
+    if not overwrite_files:
+        output_names = {location: name for location, name in output_names.items()
+                        if not os.path.isfile(name)}
+    if not output_names:
+        return
+
+    reports = load_daily_reports(input_dir, countries_only, list(output_names), processes,
+                                 cache_dir)
+    for location, country_df in reports.groupby('Location', sort=False):
+        _clean_location_df(country_df.reset_index(drop=True)).to_csv(output_names[location])
 
 def rel_reporting_calc(df, column_list):
     """Adds columns to dataframe giving weekday information,
@@ -5,67 +5,114 @@
 import os
 import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
 
-from .country_data import generate_all_df, rel_reporting_calc
+from .country_data import generate_all_df
 
 
 input_dir = "COVID-19/csse_covid_19_data/csse_covid_19_daily_reports/"
 output_dir = "data/country_data/"
 
-def _generate_pca_row(search_dir, file, column):
-    initial_df = pd.read_csv(search_dir + file)
-    initial_df["Date"] = pd.to_datetime(initial_df["Date"], format = "%Y-%m-%d")
-    initial_df.sort_values(by="Date", inplace=True)
-    return average_reporting_factor(initial_df, column)
+_SERIES_COLUMNS = ['Date', 'Confirmed', 'Deaths']
+_SOURCE_COLUMNS = {'Cases': 'Confirmed', 'Deaths': 'Deaths'}
+_PARALLEL_FILE_COUNT = 200  # Directories with more files are read in parallel
+WEEKDAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
 
-def generate_pca_array(search_dir, column):
+def _read_location_file(search_dir, file):
+    df = pd.read_csv(search_dir + file, usecols=lambda col: col in _SERIES_COLUMNS)
+    df = df.reindex(columns=_SERIES_COLUMNS)  # Missing columns are left empty
+    df['Location'] = file.split('.')[0]
+    return df
+
+def load_location_series(search_dir, processes=None):
+    """Reads the cumulative case and death counts from every location
+    file in a directory (as written by `generate_all_df`) into a single
+    long-format dataframe, sorted by location and date. Large directories
+    are read with a pool of worker processes, one file at a time.
+
+    Parameters
+    ----------
+    search_dir : str
+        Directory containing one csv file per location
+    processes : int
+        Number of worker processes - defaults to the number of CPUs
+
+    Returns
+    -------
+    pd.DataFrame : Columns 'Location', 'Date', 'Confirmed' and 'Deaths'
+    """
+    files = sorted(file for file in os.listdir(search_dir) if file.endswith('.csv'))
+    if len(files) > _PARALLEL_FILE_COUNT:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            frames = list(executor.map(_read_location_file, repeat(search_dir), files))
+    else:
+        frames = [_read_location_file(search_dir, file) for file in files]
+    if not frames:
+        return pd.DataFrame(columns=['Location', *_SERIES_COLUMNS])
+
+    df = pd.concat(frames, ignore_index=True)[['Location', *_SERIES_COLUMNS]]
+    df["Date"] = pd.to_datetime(df["Date"], format = "%Y-%m-%d")
+    return df.sort_values(['Location', 'Date'], kind='stable', ignore_index=True)
+
+def reporting_factor_matrix(df, column):
+    """Average reporting factor on each day of the week, for every
+    location in a long-format dataframe (see `load_location_series`).
+    The reporting factor on each day is the (non-negative) daily count
+    relative to its rolling weekly mean, as in `rel_reporting_calc`.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Cumulative counts, sorted by location and date
+    column : str
+        Either 'Cases' or 'Deaths'
+
+    Returns
+    -------
+    pd.DataFrame : Reporting factors, indexed by location, with one
+        column per weekday (Monday = 0)
+    """
+    locations = df['Location']
+    daily = df[_SOURCE_COLUMNS[column]].groupby(locations, sort=False).diff().clip(lower = 0)
+    mean = daily.groupby(locations, sort=False).rolling(7).mean().reset_index(level=0, drop=True)
+    factors = daily / mean
+    matrix = factors.groupby([locations, df['Date'].dt.weekday]).mean().unstack()
+    return matrix.reindex(columns=range(7))
+
+def _valid_rows(matrix):
+    """Locations with a finite average for every weekday, and positive total."""
+    return matrix[matrix.notna().all(axis=1) & (matrix.sum(axis=1) > 0)]
+
+def generate_pca_array(search_dir, column, processes=None):
     """Each row in the array corresponds to a single location,
     and has 7 elements representing the average reporting factor
     on each day of the week. The method of averaging can be specificied,
     but defaults to the median (to avoid bias from extremes.
     
     Column is either 'Cases' or 'Deaths'."""
-    pca_array = []
-    for file in os.listdir(search_dir):
-        try:
-            row = _generate_pca_row(search_dir, file, column)
-        except KeyError:
-            continue
-        if (np.any(np.isnan(row)) or (np.sum(row) <= 0)):
-            continue
-        pca_array.append(row)
-    return np.asarray(pca_array)
-
-def generate_pca_df(search_dir, column):
+    matrix = reporting_factor_matrix(load_location_series(search_dir, processes), column)
+    return _valid_rows(matrix).to_numpy()
+
+def generate_pca_df(search_dir, column, processes=None):
     """Each row in the array corresponds to a single location,
     and has 7 elements representing the average reporting factor
     on each day of the week. The method of averaging can be specificied,
     but defaults to the median (to avoid bias from extremes.
     
     Column is either 'Cases' or 'Deaths'."""
-    cols = ['Country', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-    pca_df = pd.DataFrame(columns=cols)
-    for file in os.listdir(search_dir):
-        row = _generate_pca_row(search_dir, file, column)
-        if (np.any(np.isnan(row)) or (np.sum(row) <= 0)):
-            continue
-        new_df = pd.DataFrame([[file.split('.')[0], *row]], columns=cols)
-        pca_df = pd.concat([pca_df, new_df], axis=0)
-    return pca_df
+    matrix = reporting_factor_matrix(load_location_series(search_dir, processes), column)
+    pca_df = _valid_rows(matrix).set_axis(WEEKDAY_NAMES, axis=1)
+    return pca_df.rename_axis('Country').reset_index()
 
 def average_reporting_factor(df, column):
     """Average reporting factor per weekday for a specified column."""
-    df["Daily_Deaths"] = df["Deaths"].diff()
-    df["Daily_Cases"] = df["Confirmed"].diff()
-    df[["Daily_Deaths","Daily_Cases"]] = df[["Daily_Deaths","Daily_Cases"]].clip(lower = 0)
-
-    df = rel_reporting_calc(df, ['Daily_Cases', 'Daily_Deaths'])
-    summary = df.groupby('Weekday').mean().sort_values('Day_Index')
+    df = df.sort_values('Date').assign(Location=0)
     # Mean required to ensure normalisation of summary - all values ave to 1
-    return list(summary['Dif_Daily_' + column].values)
+    return list(reporting_factor_matrix(df, column).iloc[0].values)
 
 def test_normalisation(arr, rtol):
     """Tests whether reporting factors across a week average to
@@ -84,8 +131,7 @@ def run_pca(arr, n_components):
           + str(pca_obj.explained_variance_ratio_))
     col_names = [('PC' + str(x + 1)) for x in range(n_components)]
     pca_df = pd.DataFrame(data=pca_output, columns=col_names,
-                          index=['Mon', 'Tue', 'Wed', 'Thu', 'Fri',
-                                 'Sat', 'Sun'])
+                          index=WEEKDAY_NAMES)
     return pca_df
 
 if __name__ == '__main__':
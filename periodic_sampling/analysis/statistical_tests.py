@@ -3,6 +3,7 @@
 #
 
 import numpy as np
+import pandas as pd
 import scipy.stats as ss
 
 def single_t_test(data, mu_0 = 1):
@@ -44,6 +45,16 @@ def _p_val(t_stat, dof):
     return 2*(1 - ss.t.cdf(abs(t_stat), dof))
 
 
+def _weekday_t_stats(df, columns, by=()):
+    """t statistic (as in `single_t_test`) and degrees of freedom for each
+    weekday, computed for all groups and columns in a single groupby."""
+    grouped = df.groupby([*by, 'Day_Index'])[columns]
+    x_bar = grouped.mean()
+    s = grouped.std(ddof=0)
+    n = grouped.size()
+    t_stats = (x_bar - 1).div(s).mul(np.sqrt(n), axis=0)
+    return t_stats, n - 1
+
 def weekday_t_tests(df, col, p_vals = True):
     """Conduct a t-test on named column of dataframe for each day of the week
     (dataframe must have 'Day_Index' column to denote this).
@@ -57,12 +68,40 @@ def weekday_t_tests(df, col, p_vals = True):
     p_vals : bool
         Whether to return the p_vals or the t statistic (True by defualt)
     """
-    output_stats = []
-    for i in range(7):
-        output_stats.append(single_t_test(df[df['Day_Index'] == i][col]))
-        if p_vals:
-            output_stats[i] = _p_val(output_stats[i], len(df[df['Day_Index'] == i][col]) - 1)
-    return output_stats
+    t_stats, dof = _weekday_t_stats(df, [col])
+    output_stats = t_stats[col].reindex(range(7)).to_numpy()
+    if p_vals:
+        output_stats = _p_val(output_stats, dof.reindex(range(7)).to_numpy())
+    return list(output_stats)
+
+
+def location_weekday_t_tests(df, columns, location_col = 'Location', p_vals = True):
+    """Conduct a t-test (see `single_t_test`) for each day of the week, on
+    each named column, for every location in a long-format dataframe. All
+    tests are computed together, from a single groupby.
+
+    Parameters
+    ----------
+    df : pd.Dataframe
+        Dataframe, including columns, location_col and 'Day_Index'
+    columns : list
+        Names of columns in dataframe to consider
+    location_col : str
+        Name of column identifying the location of each row
+    p_vals : bool
+        Whether to return the p_vals or the t statistic (True by defualt)
+
+    Returns
+    -------
+    pd.Dataframe : Indexed by location and column name, with one column
+        per weekday (Monday = 0)
+    """
+    t_stats, dof = _weekday_t_stats(df, list(columns), by=[location_col])
+    if p_vals:
+        t_stats = pd.DataFrame(_p_val(t_stats.to_numpy(), dof.to_numpy()[:, np.newaxis]),
+                               index=t_stats.index, columns=t_stats.columns)
+    output = t_stats.stack(future_stack=True).unstack('Day_Index')
+    return output.reindex(columns=range(7))
 
 
 def wilcoxon_signed_rank_test(df, col_1, col_2, p_vals = True):
@@ -80,10 +119,11 @@ def wilcoxon_signed_rank_test(df, col_1, col_2, p_vals = True):
     p_vals : bool
         Whether to return the p_vals or the t statistic (True by defualt)
     """
+    weekdays = dict(list(df.groupby('Day_Index')))  # Split once, rather than per weekday
     output_stats = []
     for i in range(7):
-        output_stats.append(ss.wilcoxon(df[df['Day_Index'] == i][col_1],
-                                        df[df['Day_Index'] == i][col_2],
+        weekday_df = weekdays.get(i, df.iloc[:0])
+        output_stats.append(ss.wilcoxon(weekday_df[col_1], weekday_df[col_2],
                                         nan_policy='omit'))
         if p_vals:
             output_stats[i] = output_stats[i].pvalue
@@ -106,9 +146,8 @@ def kruskal_weekday_test(df, col):
     float : The p-value for the test using the assumption that 
             H has a chi square distribution.
     """
-    weekday_df = []
-    for i in range(7):
-        weekday_df.append(df[df['Day_Index'] == i][col])
+    weekdays = dict(list(df.groupby('Day_Index')[col]))
+    weekday_df = [weekdays.get(i, df[col].iloc[:0]) for i in range(7)]
     return ss.kruskal(*weekday_df, nan_policy='omit')
 
 
@@ -116,6 +155,9 @@ def multiple_comparisons_correction(p_vals, alpha=0.05):
     """Uses the Benjamini-Hochberg procedure to combine the p values from
     multiple independent null hypothesis test results.
     
+    The p values are sorted once, so the procedure is O(n log n) and can
+    be applied to the tests for all locations at once.
+    
     Parameters
     ----------
     p_vals : list
@@ -128,16 +170,12 @@ def multiple_comparisons_correction(p_vals, alpha=0.05):
     ------
     list[bool] : Whether to accept H0 for each hypothesis (ordered)
     """
-    sorted_vals = sorted(p_vals)
-    k = 0  # Number of null hypotheses to reject
-    for i in range(len(p_vals)):
-        if sorted_vals[i] <= ((i + 1) * alpha / len(p_vals)):
-            k = (i + 1)
-    
-    passed_H0 = [True for _ in range(len(p_vals))]
-    for n in range(k):
-        failed_test_index = p_vals.index(sorted_vals[n])
-        passed_H0[failed_test_index] = False
-        p_vals[failed_test_index] = None  # Prevent refinding this value in case of duplicates
-
-    return passed_H0
+    p_vals = np.asarray(p_vals, dtype=float).ravel()
+    n = len(p_vals)
+    order = np.argsort(p_vals, kind='stable')
+    below = p_vals[order] <= np.arange(1, n + 1) * alpha / n
+    k = (np.flatnonzero(below)[-1] + 1) if below.any() else 0  # Null hypotheses to reject
+
+    passed_H0 = np.ones(n, dtype=bool)
+    passed_H0[order[:k]] = False
+    return passed_H0.tolist()
@@ -0,0 +1,262 @@
+#
+# Benchmark suite for the sampler hot paths, used as a regression check
+# Run `python benchmark.py --output results.json` from this directory to time all
+# benchmarks over a grid of series lengths (T) and initial case numbers (N_0).
+# Pass `--baseline <file>` to compare against stored results - the script exits
+# with a non-zero status if any benchmark is slower than the baseline by more
+# than the given tolerance. Results for the full grid are stored in
+# `data/benchmarks/baseline.json`, and should be regenerated on the same
+# machine before comparing (timings are not portable between machines).
+#
+# Pass `--accuracy` to also check the truth sampler, which only enumerates a
+# window of candidate values (or uses a normal approximation) for large counts,
+# against the full enumeration over the same grid - the script exits with a
+# non-zero status if the total variation distance between the two exceeds
+# `--max-tv` at any index.
+#
+
+import argparse
+import json
+import platform
+import sys
+import time
+import numpy as np
+import scipy
+import scipy.stats as ss
+
+from synthetic_data import RenewalModel, Reporter
+from sampling_methods import MixedSampler, ParameterState
+import periodic_model as pm
+
+
+T_VALUES = [100, 500, 1000, 2000]
+N0_VALUES = [100, 1000, 10000, 100000]
+BIAS = [0.5, 1.4, 1.2, 1.1, 1.1, 1.1, 0.6]  # Always given with monday first
+
+
+def _time(func, repeats):
+    """Best wall time of several calls to func, in seconds"""
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def _simulate(T, N_0, seed):
+    """Case data from a renewal model with constant R, so case numbers stay of order N_0"""
+    np.random.seed(seed)
+    model = RenewalModel(R0=1.0)
+    model.simulate(T=T, N_0=N_0, display_progress=False)
+    return model
+
+def _build_state(model):
+    """Parameter state for the variable Rt model, in the layout of `inference_workflow.py`"""
+    rep = Reporter(model.case_data)
+    I_data = list(rep.fixed_bias_report(bias=BIAS, method='poisson')['Confirmed'])
+
+    params = {'bias_prior_alpha': 1, 'bias_prior_beta': 1,
+              'rt_prior_alpha': 1, 'rt_prior_beta': 1,
+              'serial_interval': model.serial_interval, 'Rt_window': 7}
+    for i, val in enumerate(I_data):
+        params[("data_" + str(i))] = val
+    data_initial_guess = sum(I_data) / len(I_data)
+    for i in range(len(I_data)):
+        params[("truth_" + str(i))] = pm.truth_parameter(data_initial_guess, index=i)
+    for i in range(7):
+        params[("bias_" + str(i))] = pm.poisson_bias_parameter(value=1, index=i)
+    for i in range(len(I_data)):
+        params[("R_" + str(i))] = pm.rt_parameter(value=1, index=i)
+    return ParameterState.from_params(params)
+
+def run_benchmarks(T, N_0, repeats = 3, step_num = 2, seed = 41):
+    """Times each benchmark for a single point of the grid.
+
+    Parameters
+    ----------
+    T : int
+        Length of the simulated timeseries
+    N_0 : int
+        Number of initial cases of the simulation
+    repeats : int
+        Number of repeats of each benchmark - the best time is reported
+    step_num : int
+        Number of iterations of the full sampling routine to time
+    seed : int
+        Seed for all random draws
+
+    Returns
+    -------
+    list : Dictionary of results for each benchmark
+    """
+    series = np.arange(T)
+    results = {}
+
+    results['RenewalModel.simulate'] = (_time(lambda : _simulate(T, N_0, seed), repeats), 1)
+    state = _build_state(_simulate(T, N_0, seed))
+
+    def lambda_sweep():
+        state._clear_caches()  # Time the cold computation over the whole series
+        for t in series:
+            pm._calculate_lambda(state, t)
+    results['_calculate_lambda'] = (_time(lambda_sweep, repeats), T)
+
+    sample_indices = series[::max(1, T // 50)]
+    def truth_sweep():
+        for t in sample_indices:
+            pm._timeseries_truth_sample(state, index=t)
+    results['_timeseries_truth_sample'] = (_time(truth_sweep, repeats), len(sample_indices))
+
+    def bias_sweep():
+        state.set_value('truth_0', state['truth_0'].value)  # Invalidates the truth sums
+        for i in range(7):
+            pm._poisson_bias_pdf_params(state, index=i)
+            pm._scale_bias_pdf_params(state, index=i)
+    results['bias_posterior_params'] = (_time(bias_sweep, repeats), 14)
+
+    def rt_sweep():
+        state.set_value('truth_0', state['truth_0'].value)
+        for t in series:
+            pm._rt_params(state, final_index=t)
+    results['rt_posterior_params'] = (_time(rt_sweep, repeats), T)
+
+    def sampling():
+        np.random.seed(seed)
+        sampler = MixedSampler(_build_state(_simulate(T, N_0, seed)))
+        sampler.sampling_routine(step_num=step_num, display_progress=False)
+    results['MixedSampler.sampling_routine'] = (_time(sampling, repeats), step_num)
+
+    return [{'benchmark': name, 'T': T, 'N_0': N_0, 'seconds': seconds,
+             'calls': calls, 'seconds_per_call': seconds / calls}
+            for name, (seconds, calls) in results.items()]
+
+def truth_sampler_accuracy(T, N_0, seed = 41):
+    """Total variation distance between the distribution sampled by
+    `_timeseries_truth_sample` and the full enumeration of candidate values
+    (from 0 to twice the data value), for a single point of the grid. Both
+    are computed exactly, rather than estimated from samples.
+
+    Parameters
+    ----------
+    T : int
+        Length of the simulated timeseries
+    N_0 : int
+        Number of initial cases of the simulation
+    seed : int
+        Seed for all random draws
+
+    Returns
+    -------
+    dict : Largest total variation distance over the indices checked, with
+        the fraction of these approximated by a normal distribution and the
+        largest number of candidate values enumerated
+    """
+    state = _build_state(_simulate(T, N_0, seed))
+    max_tv, n_approximate, max_candidates = 0, 0, 0
+    sample_indices = np.arange(T)[::max(1, T // 50)]
+    for t in sample_indices:
+        values = np.arange(max(1, 2 * int(state.data[t])))
+        exact = pm._truth_loglikelihood(state, t, values)
+        exact = np.exp(exact - exact.max())
+        exact /= exact.sum()
+
+        mu = pm._calculate_lambda(state, t) * pm._r_value(state, t)
+        lower, size, approximate, mode, sd = pm._truth_candidates(
+            state.data[t:t + 1], np.atleast_1d(mu), state.bias[t % 7:t % 7 + 1])
+        if approximate[0]:  # Normal distribution, rounded and clipped to the grid
+            edges = np.concatenate([[-np.inf], values[1:] - 0.5, [np.inf]])
+            sampled = np.diff(ss.norm.cdf(edges, loc=mode[0], scale=sd[0]))
+            n_approximate += 1
+        else:  # Enumeration over the window, renormalised
+            sampled = np.zeros(len(values))
+            window = slice(lower[0], lower[0] + size[0])
+            sampled[window] = exact[window] / exact[window].sum()
+            max_candidates = max(max_candidates, size[0])
+        max_tv = max(max_tv, 0.5 * np.abs(exact - sampled).sum())
+    return {'T': T, 'N_0': N_0, 'max_tv': max_tv,
+            'approximated': n_approximate / len(sample_indices),
+            'max_candidates': int(max_candidates)}
+
+def compare(results, baseline, tolerance):
+    """Compares results against a stored baseline.
+
+    Parameters
+    ----------
+    results : list
+        Benchmark results, as returned by `run_benchmarks`
+    baseline : list
+        Stored benchmark results in the same format
+    tolerance : float
+        Largest acceptable ratio of new to baseline time
+
+    Returns
+    -------
+    list : Comparison for each benchmark present in both, with a flag
+        for those slower than the tolerance allows
+    """
+    stored = {(r['benchmark'], r['T'], r['N_0']): r for r in baseline}
+    comparison = []
+    for result in results:
+        key = (result['benchmark'], result['T'], result['N_0'])
+        if key not in stored:
+            continue
+        ratio = result['seconds_per_call'] / stored[key]['seconds_per_call']
+        comparison.append({'benchmark': key[0], 'T': key[1], 'N_0': key[2],
+                           'ratio': ratio, 'regression': ratio > tolerance})
+    return comparison
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark suite for the sampler hot paths")
+    parser.add_argument('--T', type=int, nargs='+', default=T_VALUES,
+                        help="Series lengths to benchmark")
+    parser.add_argument('--N0', type=int, nargs='+', default=N0_VALUES,
+                        help="Initial case numbers to benchmark")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--steps', type=int, default=2,
+                        help="Iterations of the full sampling routine to time")
+    parser.add_argument('--output', help="File to write results to (JSON)")
+    parser.add_argument('--baseline', help="Stored results to compare against (JSON)")
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help="Largest acceptable ratio of new to baseline time")
+    parser.add_argument('--accuracy', action='store_true',
+                        help="Check the truth sampler against full enumeration")
+    parser.add_argument('--max-tv', type=float, default=2e-3,
+                        help="Largest acceptable total variation distance of the truth sampler")
+    args = parser.parse_args()
+
+    results = []
+    for T in args.T:
+        for N_0 in args.N0:
+            for result in run_benchmarks(T, N_0, repeats=args.repeats, step_num=args.steps):
+                print(f"{result['benchmark']:<32} T={T:<5} N_0={N_0:<7} "
+                      f"{result['seconds_per_call']:.3e} s/call")
+                results.append(result)
+
+    output = {'metadata': {'python': platform.python_version(), 'numpy': np.__version__,
+                           'scipy': scipy.__version__, 'machine': platform.machine(),
+                           'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')},
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        comparison = compare(results, baseline, args.tolerance)
+        for entry in comparison:
+            flag = 'REGRESSION' if entry['regression'] else ''
+            print(f"{entry['benchmark']:<32} T={entry['T']:<5} N_0={entry['N_0']:<7} "
+                  f"x{entry['ratio']:.2f} {flag}")
+        if any(entry['regression'] for entry in comparison):
+            sys.exit(1)
+
+    if args.accuracy:
+        accuracy = [truth_sampler_accuracy(T, N_0) for T in args.T for N_0 in args.N0]
+        for entry in accuracy:
+            print(f"{'truth_sampler_accuracy':<32} T={entry['T']:<5} N_0={entry['N_0']:<7} "
+                  f"tv={entry['max_tv']:.1e} approximated={entry['approximated']:.0%} "
+                  f"candidates={entry['max_candidates']}")
+        if any(entry['max_tv'] > args.max_tv for entry in accuracy):
+            sys.exit(1)
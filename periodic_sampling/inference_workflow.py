@@ -18,9 +18,9 @@ import scipy.stats as ss
 import matplotlib.pyplot as plt
 plt.rcParams['font.size'] = '12'
 
-from synthetic_data import RenewalModel, Reporter
+from synthetic_data import RenewalModel, Reporter, serial_interval
 from sampling_methods import GibbsParameter, MixedSampler
-from periodic_model import truth_parameter, poisson_bias_parameter, rt_parameter
+from periodic_model import truth_parameter, truth_block_parameter, poisson_bias_parameter, rt_parameter
 
 
 
@@ -130,54 +130,55 @@ from periodic_model import truth_parameter, poisson_bias_parameter, rt_parameter
 
 ####### VARIABLE RT, MULTI-CHAIN WORKFLOW
 
-# Simulate Renewal Model
-time_steps = 100; N_0 = 100; R0_diff = 0.2
-start_date = '01/01/2020'; bias_method = 'scale'
-bias = [0.5, 1.4, 1.2, 1.1, 1.1, 1.1, 0.6]  # Always given with monday first
-R0_list = ([1.0 + R0_diff] * int(time_steps/2)) + ([1.0 - R0_diff] * int(time_steps/2))
+# Chains are run in parallel, so the workflow must be guarded for worker processes
+if __name__ == '__main__':
+    # Simulate Renewal Model
+    time_steps = 100; N_0 = 100; R0_diff = 0.2
+    start_date = '01/01/2020'; bias_method = 'scale'
+    bias = [0.5, 1.4, 1.2, 1.1, 1.1, 1.1, 0.6]  # Always given with monday first
+    R0_list = ([1.0 + R0_diff] * int(time_steps/2)) + ([1.0 - R0_diff] * int(time_steps/2))
 
-np.random.seed(41)
-model = RenewalModel()
-model.simulate(T=time_steps, N_0=N_0, R_0=R0_list)
-rep = Reporter(model.case_data, start_date=start_date) 
+    np.random.seed(41)
+    model = RenewalModel()
+    model.simulate(T=time_steps, N_0=N_0, R_0=R0_list)
+    rep = Reporter(model.case_data, start_date=start_date) 
 
-bias_df = rep.fixed_bias_report(bias=bias, method=bias_method)
-I_data = list(bias_df['Confirmed'])
+    bias_df = rep.fixed_bias_report(bias=bias, method=bias_method)
+    I_data = list(bias_df['Confirmed'])
 
-seeds = list(range(4)); output = pd.DataFrame()
-step_num = int(1e5)
-output1 = pd.DataFrame()
+    seeds = list(range(4))
+    step_num = int(1e5)
 
-for seed in seeds:
     params = {'bias_prior_alpha': 1, 'bias_prior_beta': 1,
             'rt_prior_alpha': 1, 'rt_prior_beta': 1}  # Gamma dist
 
-    params['serial_interval'] = RenewalModel(R0=None).serial_interval
+    params['serial_interval'] = serial_interval()
     params['Rt_window'] = 7  # Assume it is constant for 7 days
 
     for i, val in enumerate(I_data):  # Observed cases - not a Parameter
         params[("data_" + str(i))] = val
 
     data_initial_guess = sum(I_data)/len(I_data)  # Constant initial value
-    for i in range(0, len(I_data)):  # Ground truth data
-        params[("truth_" + str(i))] = truth_parameter(data_initial_guess, index=i, sampling_freq=2000)
+    # Ground truth data, all drawn together each iteration
+    params['truth'] = truth_block_parameter(np.full(len(I_data), data_initial_guess))
 
     for i in range(7):  # Weekday bias parameters
-        params[("bias_" + str(i))] = poisson_bias_parameter(value=2 * np.random.random(), index=i)
+        params[("bias_" + str(i))] = poisson_bias_parameter(value=1, index=i)
 
     for i in range(0, len(I_data)):  # Reproductive number values
         params[("R_" + str(i))] = rt_parameter(value=1, index=i)
 
+    # Each chain starts from different random bias values
+    initial_values = [{("bias_" + str(i)): 2 * np.random.random() for i in range(7)}
+                      for _ in seeds]
 
     sampler = MixedSampler(params=params)
-    output1 = pd.concat([output1, sampler.sampling_routine(step_num=step_num,
-                                                           sample_burnin=0,
-                                                           chain_num=seed)],
-                         axis=0) 
-    
+    output1 = sampler.multi_chain_routine(chain_num=len(seeds), step_num=step_num,
+                                          sample_burnin=0, seed=41,
+                                          initial_values=initial_values)
 
-filename = f"inference_T_{bias_method}_{time_steps}_N0_{N_0}_R0diff_{R0_diff}_It_{step_num}_seeds_{seed+1}.csv"
-output1.to_csv('data/outputs/stepped_R/multichain/variable_sampling_rate/' + filename)
+    filename = f"inference_T_{bias_method}_{time_steps}_N0_{N_0}_R0diff_{R0_diff}_It_{step_num}_seeds_{len(seeds)}.csv"
+    output1.to_csv('data/outputs/stepped_R/multichain/variable_sampling_rate/' + filename)
 
 # output1 = pd.read_csv('data/outputs/stepped_R/multichain/fixed_r_stage/step1_fixed_inference_T_scale_100_N0_100_R0diff_0.2_It_500_seeds_6.csv')
 
@@ -200,7 +201,7 @@ output1.to_csv('data/outputs/stepped_R/multichain/variable_sampling_rate/' + fil
 #     params = {'bias_prior_alpha': 1, 'bias_prior_beta': 1,
 #             'rt_prior_alpha': 1, 'rt_prior_beta': 1}  # Gamma dist
 
-#     params['serial_interval'] = RenewalModel(R0=None).serial_interval
+#     params['serial_interval'] = serial_interval()
 #     params['Rt_window'] = 1  # Assume it is constant for 7 days
 
 #     for i, val in enumerate(I_data):  # Observed cases - not a Parameter
@@ -2,99 +2,246 @@
 # Collection of functions for our periodic sampling formualtion
 # See `fixed_bias_sampler` or `variable_Rt_sampler` for derivations of functions included
 #
+# All conditionals read from a `ParameterState`, which holds the `data_`, `truth_`,
+# `R_` and `bias_` values as arrays (`state.data`, `state.truth`, ...), so no
+# function needs to scan the parameter names to recover the shape of the model.
+#
 
-import math
 import numpy as np
+from functools import partial
 import scipy.stats as ss
+from scipy.special import gammaln, xlogy
 
-from sampling_methods import GibbsParameter
+from sampling_methods import GibbsBlock, MetropolisBlock, StateGibbsParameter
+from synthetic_data import cumulative_normalisation
 
 
 #  --- TIMESERIES PARAMETERS ---
 
-def _ramanujan_approx(n):
-    """Approximation to log(n!) for large n to avoid integer overflow"""
-    if n==0:
-        return 0
-    return n*math.log(n) - n + math.log(n*(1+4*n*(1+2*n)))/6 + math.log(math.pi)/2
+class _LogFactorialTable:
+    """Lookup table of log(k!) for k = 0, 1, ..., at least up to the largest
+    count in the truth-sampling grid (twice the largest data value). The
+    table is extended (at least doubled) if a larger count is requested."""
+
+    def __init__(self, max_k):
+        self.values = gammaln(np.arange(max_k + 1) + 1.0)
+
+    def __call__(self, k):
+        """log(k!) for an array of non-negative integers k"""
+        max_k = int(k.max()) if k.size else 0
+        if max_k >= len(self.values):
+            self.__init__(max(max_k, 2 * len(self.values)))
+        return self.values[k]
 
-def _poisson_logpmf(k, mu):
-    """Intended to replace `ss.poisson.logpmf`, giving a x4 speed increase.
-    Uses log(x**k) = k/log_x(e) and Ramanujan approximation for log(k!) to
-    handle large values of k.
+def _log_factorial_table(state):
+    """Lookup table of log(k!) for the counts in the state, from its cache."""
+    return state.cache('log_factorial',
+                       lambda : _LogFactorialTable(2 * max(int(np.max(state.data)), 1)))
+
+def _poisson_logpmf(k, mu, log_factorial=None):
+    """Log of the Poisson pmf, evaluated over arrays of k and/or mu in a
+    single pass. k*log(mu) is computed with `xlogy`, so a zero mean gives
+    log(1) = 0 for k = 0 and -inf otherwise. log(k!) is exact (using
+    `gammaln`), and read from a lookup table for integer k where given.
     
     Parameters
     ----------
-    k : float
+    k : array_like
         Predicted number of events
-    mu : float 
+    mu : array_like
         Average number of events (mean of Poisson distribution)
+    log_factorial : _LogFactorialTable
+        Lookup table of log(k!), used if k is an array of integers
         
     Returns
     -------
-    float : Log of the pmf function
+    np.ndarray : Log of the pmf function for each pair of (k, mu)
+    """
+    k = np.asarray(k)
+    mu = np.asarray(mu, dtype=float)
+    if log_factorial is not None and np.issubdtype(k.dtype, np.integer):
+        log_k_factorial = log_factorial(k)
+    else:
+        log_k_factorial = gammaln(k + 1.0)
+    return xlogy(k, mu) - mu - log_k_factorial
+
+def _r_value(state, index):
+    """Reproduction number in effect at a given index of the timeseries - 
+    the most recent R value where R is not specified at every index.
+
+    Parameters
+    ----------
+    state : ParameterState
+        State object for all inference variables and associated parameters
+    index : int
+        Index of timeseries to find R for
+
+    Returns
+    -------
+    float : Reproduction number at the given index
+    """
+    if 'R' in state.families:
+        R_values = state.R
+        return R_values[min(index, len(R_values) - 1)]
+    return state.view['R_t']  # Single fixed R value
+
+def _r_series(state):
+    """Reproduction number in effect at every index of the timeseries.
+
+    Parameters
+    ----------
+    state : ParameterState
+        State object for all inference variables and associated parameters
+
+    Returns
+    -------
+    np.ndarray : Reproduction number at each index of the timeseries
     """
-    if mu == 0:
-        return -1e10  # Should be -inf but throws issues in sampling
-    if mu == 1:
-        return -mu
-    return (-mu + (k/math.log(math.e, mu)) - _ramanujan_approx(k))
-
-def _truth_loglikelihood(params, index, value):
-    """The independant probability of a given value for a given index of truth time series.
+    series_len = len(state.data)
+    if 'R' not in state.families:
+        return np.full(series_len, state.view['R_t'])
+    R_values = state.R
+    if len(R_values) >= series_len:
+        return R_values[:series_len]
+    return np.concatenate([R_values, np.full(series_len - len(R_values), R_values[-1])])
+
+def _truth_values(state):
+    """Truth timeseries, estimated from the data and bias values where
+    the truth is not itself inferred.
+
+    Parameters
+    ----------
+    state : ParameterState
+        State object for all inference variables and associated parameters
+
+    Returns
+    -------
+    np.ndarray : Value of the truth timeseries at each index
+    """
+    if 'truth' in state.families:
+        return state.truth
+    data = state.data
+    return (data / state.bias[np.arange(len(data)) % 7]).astype(int)
+
+def _truth_loglikelihood(state, index, value):
+    """The independant probability of given values for a given index of truth time series.
+    Lambda is computed once, and all values are evaluated together.
     
     Parameters
     ----------
-    params : Dict
-        Dictionary object for all inference variables and associated parameters
+    state : ParameterState
+        State object for all inference variables and associated parameters
     index : int
         Index of timeseries to sample from
-    value : int
-        Predicted number of events for this element of the timeseries
+    value : int or array_like
+        Predicted number(s) of events for this element of the timeseries
         
     Returns
     -------
-    float : Loglikelihood of the value at the given index in the timeseries
+    np.ndarray : Loglikelihood of each value at the given index in the timeseries
     """
-    if ('R_' + str(index)) in params:
-        R_value = params['R_' + str(index)]
-    else:  # Find most recent R value
-        times = [name[2:] for name in params.keys() if name.startswith('R_')]
-        R_value = params['R_' + str(max(times))]
-
     prob_truth = _poisson_logpmf(k=value,
-                                    mu=_calculate_lambda(params, index) * R_value)
+                                 mu=_calculate_lambda(state, index) * _r_value(state, index),
+                                 log_factorial=_log_factorial_table(state))
 
-    prob_measurement = _poisson_logpmf(k=params['data_' + str(index)],
-                                        mu=(params['bias_' + str(index % 7)].value 
-                                            * value))        
+    prob_measurement = _poisson_logpmf(k=state.data[index],
+                                       mu=(state.bias[index % 7] * np.asarray(value)))
     return prob_truth + prob_measurement
 
-def _calculate_lambda(params, max_t):
+class _LambdaCache:
+    """Historic lambda factor at every index of the data series, kept up to
+    date as the series changes. For more detailed description of the lambda
+    factor, see `renewal_model.py`.
+
+    Lambda is a convolution of the observed data (`data_`) with the serial
+    interval, so updates to the truth timeseries never invalidate it. When a
+    data value changes only the entries within the support of the serial
+    interval downstream of it are recomputed, and the initial entry (a best
+    guess of data_0 / bias_0) is refreshed whenever bias_0 changes.
+    """
+
+    def __init__(self, state):
+        """Computes lambda over the whole series, and subscribes to the
+        families it depends on.
+
+        Parameters
+        ----------
+        state : ParameterState
+            State object for all inference variables and associated parameters
+        """
+        self.state = state
+        self.omega = np.asarray(state['serial_interval'], dtype=float)
+        series_len = len(state.data)
+
+        # Where max_t < len(omega) the serial interval is truncated and renormalised
+        self.norm = np.ones(series_len)
+        n_truncated = min(series_len, len(self.omega))
+        self.norm[:n_truncated] = cumulative_normalisation(self.omega)[:n_truncated]
+
+        cases = state.data.astype(float)
+        convolution = np.convolve(cases, self.omega)[:series_len] - self.omega[0] * cases
+        self.values = np.divide(convolution, self.norm, out=np.zeros(series_len),
+                                where=self.norm > 0)  # Initial point set separately
+        self._update_initial()
+
+        state.subscribe('data', self._data_changed)
+        state.subscribe('bias', self._bias_changed)
+
+    def _update_initial(self):
+        """Best guess of lambda at the initial point, with no history"""
+        self.values[0] = self.state.data[0] / self.state.bias[0]
+
+    def _recompute(self, start, stop):
+        """Recomputes lambda for indices [start, stop) from the data."""
+        cases = self.state.data
+        for t in range(max(start, 1), stop):
+            n_terms_lambda = min(t + 1, len(self.omega))  # Number of terms in sum for lambda
+            history = cases[t - 1::-1][:n_terms_lambda - 1]  # cases[t-1], cases[t-2], ...
+            self.values[t] = np.dot(self.omega[1:n_terms_lambda], history) / self.norm[t]
+        if start == 0:
+            self._update_initial()
+
+    def _data_changed(self, start, stop, old):
+        """Invalidates entries whose convolution includes data[start:stop]."""
+        self._recompute(start, min(len(self.values), stop + len(self.omega) - 1))
+
+    def _bias_changed(self, start, stop, old):
+        if start == 0:
+            self._update_initial()
+
+
+def _lambda_values(state):
+    """Lambda at every index of the data series, from the cache held on the state.
+    
+    Parameters
+    ----------
+    state : ParameterState
+        State object for all inference variables and associated parameters
+        
+    Returns
+    -------
+    np.ndarray : Lambda value at each index of the timeseries
+    """
+    return state.cache('lambda', lambda : _LambdaCache(state)).values
+
+def _calculate_lambda(state, max_t):
     """Historic lambda factor for a given index of data series. For more detailed
     description of the lambda factor, see `renewal_model.py`.
     
     Parameters
     ----------
-    params : Dict
-        Dictionary object for all inference variables and associated parameters
+    state : ParameterState
+        State object for all inference variables and associated parameters
     max_t : int
         Maximum index of timeseries to calculate lambda up to
         
     Returns
     -------
-    float : Loglikelihood of the value at the given index in the timeseries
+    float : Lambda value at the given index in the timeseries
     """
-    if max_t == 0:
-        return (params['data_0'] / params['bias_0'])  # Best guess of initial point
-    omega = params['serial_interval']
-    cases = [params[k] for k in params.keys() if k.startswith('data_')]
-    n_terms_lambda = min(max_t + 1, len(omega))  # Number of terms in sum for lambda
-    if max_t < len(omega):
-        omega = omega / sum(omega[:n_terms_lambda])
-    return sum([omega[i] * cases[max_t - i] for i in range(1, n_terms_lambda)])
-
-def _categorical_log(log_p):
+    return _lambda_values(state)[max_t]
+
+def _categorical_log(log_p, random_state=None):
     """Generate one sample from a categorical distribution with event
     probabilities provided in log-space. Credit to Richard Creswell.
 
@@ -102,6 +249,8 @@ def _categorical_log(log_p):
     ----------
     log_p : array_like
         logarithms of event probabilities, which need not be normalized
+    random_state : np.random.Generator or np.random.RandomState
+        Source of the uniform draw - defaults to NumPy's global random state
 
     Returns
     -------
@@ -109,19 +258,126 @@ def _categorical_log(log_p):
         One sample from the categorical distribution, given as the index of that
         event from log_p.
     """
-    exp_sample = np.log(np.random.random())
-    events = np.logaddexp.accumulate(np.hstack([[-np.inf], log_p]))
-    events -= events[-1]
-    sample = next(x[0]-1 for x in enumerate(events) if x[1] >= exp_sample)
-    return sample
+    cumulative = np.logaddexp.accumulate(log_p)  # Unnormalised log-cdf
+    random_state = np.random.mtrand._rand if random_state is None else random_state
+    exp_sample = np.log(random_state.random()) + cumulative[-1]
+    sample = np.searchsorted(cumulative, exp_sample)  # Inverse cdf
+    return min(sample, len(cumulative) - 1)
+
+_TRUTH_WINDOW_SDS = 8  # Half-width of the window of candidate truth values, in standard deviations
+_TRUTH_MAX_CANDIDATES = 2048  # Most candidate values enumerated at a single index
+
+def _truth_conditional_mode(data, mu, bias):
+    """Approximate mode and standard deviation of the conditional distribution
+    of the truth value at each index, which is log-concave. The log density
+    v log(mu) - log(v!) + d log(b v) - b v is treated as a function of
+    continuous v (with digamma(v + 1) ~ log(v + 1/2)). Its stationary point
+    lies between those of the two Poisson terms (mu - 1/2 and d / b), so is
+    found by bisection of log(v) between these, then refined by Newton steps.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Data value (d) at each index
+    mu : np.ndarray
+        Mean of the truth value (R * lambda) at each index
+    bias : np.ndarray
+        Bias value (b) at each index
+
+    Returns
+    -------
+    tuple : Arrays of the mode and standard deviation at each index
+    """
+    log_mu = np.log(np.maximum(mu, np.finfo(float).tiny))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        likelihood_mode = np.where(bias > 0, data / bias, 0.5)
+    bounds = np.maximum([mu - 0.5, likelihood_mode], 0.5)
+    low, high = np.log(bounds.min(axis=0)), np.log(bounds.max(axis=0))
+
+    def gradient(log_v):
+        v = np.exp(log_v)
+        return log_mu - bias - np.log(v + 0.5) + data / v, - v / (v + 0.5) - data / v
+
+    for _ in range(12):
+        middle = (low + high) / 2
+        increasing = gradient(middle)[0] > 0
+        low, high = np.where(increasing, middle, low), np.where(increasing, high, middle)
+    log_v = (low + high) / 2
+    for _ in range(3):
+        value, derivative = gradient(log_v)
+        log_v = np.clip(log_v - value / derivative, low, high)
+    v = np.exp(log_v)
+    return v, 1 / np.sqrt(1 / (v + 0.5) + data / v ** 2)
+
+def _truth_candidates(data, mu, bias):
+    """Range of candidate values enumerated for the truth value at each index.
 
-def _timeseries_truth_sample(params, index):
+    The full grid of values from 0 to twice the data value (and at least 1)
+    is used while it has at most `_TRUTH_MAX_CANDIDATES` values. Otherwise,
+    only the values within `_TRUTH_WINDOW_SDS` standard deviations of the
+    conditional mode are enumerated, which leaves out less than 1e-14 of the
+    probability. Where even this window is too wide (of order 30,000 cases
+    per day), the conditional is approximated by a normal distribution
+    around its mode (rounded to the nearest integer), whose total variation
+    distance from the enumerated distribution falls as 1 / sd and is below
+    1e-3 at this size. The cost of a draw is therefore bounded, whatever the
+    magnitude of the counts (see `truth_sampler_accuracy` in `benchmark.py`).
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Data value at each index
+    mu : np.ndarray
+        Mean of the truth value (R * lambda) at each index
+    bias : np.ndarray
+        Bias value at each index
+
+    Returns
+    -------
+    tuple : Arrays of the first candidate value and the number of candidates
+        at each index, a mask of indices approximated by a normal
+        distribution, and the mode and standard deviation at each index
+        (only computed, and otherwise nan, where the full grid is not used)
+    """
+    n_grid = np.maximum(1, 2 * data.astype(np.int64))
+    lower, size = np.zeros_like(n_grid), n_grid.copy()
+    approximate = np.zeros(len(n_grid), dtype=bool)
+    mode, sd = np.full(len(n_grid), np.nan), np.full(len(n_grid), np.nan)
+    windowed = n_grid > _TRUTH_MAX_CANDIDATES
+    if not windowed.any():
+        return lower, size, approximate, mode, sd
+
+    n_grid = n_grid[windowed]
+    mode[windowed], sd[windowed] = _truth_conditional_mode(data[windowed], mu[windowed],
+                                                           bias[windowed])
+    # Mass is at the end of the grid when the mode is beyond it
+    centre = np.minimum(mode[windowed], n_grid - 1)
+    half_width = _TRUTH_WINDOW_SDS * sd[windowed]
+    window_lower = np.maximum(0, np.floor(centre - half_width)).astype(np.int64)
+    window_upper = np.minimum(n_grid, np.ceil(centre + half_width).astype(np.int64) + 1)
+
+    # Normal approximation only where the grid does not truncate the window
+    approximate[windowed] = ((window_upper - window_lower > _TRUTH_MAX_CANDIDATES)
+                             & (window_lower > 0) & (window_upper < n_grid))
+    size[windowed] = np.minimum(window_upper - window_lower, _TRUTH_MAX_CANDIDATES)
+    lower[windowed] = np.where(window_lower > 0, window_upper - size[windowed], 0)
+    return lower, size, approximate, mode, sd
+
+def _truth_normal_sample(mode, sd, n_grid, random_state):
+    """Draws truth values from the normal approximation to their conditional
+    distribution, rounded to the nearest candidate value."""
+    values = np.rint(mode + sd * random_state.standard_normal(np.shape(mode)))
+    return np.clip(values, 0, n_grid - 1)
+
+def _timeseries_truth_sample(state, index):
     """Independent sample of a single datapoint from the truth timeseries.
+    Enumerates the candidate values given by `_truth_candidates`, so the
+    cost is bounded for counts of any size.
     
     Parameters
     ----------
-    params : Dict
-        Dictionary object for all inference variables and associated parameters
+    state : ParameterState
+        State object for all inference variables and associated parameters
     index : int
         Index of timeseries to sample from
         
@@ -129,23 +385,34 @@ def _timeseries_truth_sample(params, index):
     -------
     int : Sampled value of given index of timeseries
     """
-    weights = []
-    values = range(max(1, 2 * params['data_' + str(index)]))
-    for val in values:
-        # Checks values from 0 to 2 * current value
-        # Safeguard that it should check up to 1 at least in case current value is poor
-        weights.append(_truth_loglikelihood(params, index, val)) # for value
-    
-    index = _categorical_log(weights)
-    return values[index]
+    # Checks values from 0 to 2 * current value
+    # Safeguard that it should check up to 1 at least in case current value is poor
+    n_grid = max(1, 2 * int(state.data[index]))
+    if n_grid <= _TRUTH_MAX_CANDIDATES:
+        values = np.arange(n_grid)
+    else:
+        data = state.data[index:index + 1]
+        mu = _calculate_lambda(state, index) * _r_value(state, index)
+        lower, size, approximate, mode, sd = _truth_candidates(
+            data, np.atleast_1d(mu), state.bias[index % 7:index % 7 + 1])
+        if approximate[0]:
+            if state.stats is not None:
+                state.stats.record_likelihood('truth', 1)
+            return int(_truth_normal_sample(mode[0], sd[0], n_grid, state.random_generator()))
+        values = np.arange(lower[0], lower[0] + size[0])
+    weights = _truth_loglikelihood(state, index, values)
+    if state.stats is not None:
+        state.stats.record_likelihood('truth', len(values))
+
+    return values[_categorical_log(weights, state.random_generator())]
 
 def truth_parameter(value, index, sampling_freq = 1):
     """Creates parameter object for a single data point of known index 
     in truth array. 
 
     Uses Gibbs framework, but samples next values indepedently, rather 
-    than from the conditional distribution (the sample method of the
-    parameter is overwritten to allow this).
+    than from the conditional distribution (using a StateGibbsParameter,
+    which is passed the whole parameter state).
 
     Parameters
     ----------
@@ -159,52 +426,327 @@ def truth_parameter(value, index, sampling_freq = 1):
         
     Returns
     -------
-    GibbsParameter : Parameter object for given index of timeseries
+    StateGibbsParameter : Parameter object for given index of timeseries
+    """
+    # Samples independently, rather than from the conditional distribution
+    return StateGibbsParameter(value=value, sampling_freq=sampling_freq,
+                               conditional_posterior=partial(_timeseries_truth_sample, index=index))
+
+def _categorical_log_rows(log_p, random_state=None):
+    """Generate one sample from each of a set of categorical distributions,
+    with event probabilities provided in log-space (one distribution per
+    row), using one uniform draw per row as in `_categorical_log`.
+
+    Parameters
+    ----------
+    log_p : np.ndarray
+        Array of shape (n_distributions, n_events) of logarithms of event
+        probabilities, which need not be normalized. Rows may be padded
+        with -inf for events that are not possible
+    random_state : np.random.Generator or np.random.RandomState
+        Source of the uniform draws - defaults to NumPy's global random state
+
+    Returns
+    -------
+    np.ndarray : One sample from each distribution, given as the index of that
+        event in its row of log_p
+    """
+    max_log_p = log_p.max(axis=1, keepdims=True)
+    max_log_p[~np.isfinite(max_log_p)] = 0  # Rows with no possible events
+    cumulative = np.cumsum(np.exp(log_p - max_log_p), axis=1)  # Unnormalised cdf
+    random_state = np.random.mtrand._rand if random_state is None else random_state
+    sample = random_state.random(len(log_p)) * cumulative[:, -1]
+    samples = np.sum(cumulative < sample[:, np.newaxis], axis=1)  # Inverse cdf
+    return np.minimum(samples, log_p.shape[1] - 1)
+
+def _truth_block_params(state):
+    """Log likelihood of every candidate value at every index of the truth
+    timeseries, as a single padded array. The candidates at each index are
+    those given by `_truth_candidates`, and entries beyond these (and all
+    entries at indices approximated by a normal distribution) are -inf.
+    
+    Parameters
+    ----------
+    state : ParameterState
+        State object for all inference variables and associated parameters
+        
+    Returns
+    -------
+    dict : Parameters for `_truth_block_sample` - the array of shape
+        (len(data), max_candidates) of log weights under 'log_p', where the
+        candidate value is the index of each column plus the first
+        candidate value at that index ('lower'), and the parameters of the
+        normal approximation at the remaining indices
+    """
+    data = state.data
+    mu = _lambda_values(state) * _r_series(state)
+    bias = state.bias[np.arange(len(data)) % 7]
+    lower, size, approximate, mode, sd = _truth_candidates(data, mu, bias)
+    size = np.where(approximate, 0, size)
+    values = np.arange(max(size.max(), 1))  # Shared by all indices, unless any use a window
+    if lower.any():
+        values = lower[:, np.newaxis] + values
+
+    # The two Poisson terms, log(mu^v e^-mu / v!) + log((b v)^d e^-bv / d!), split
+    # into terms in the value v, in the index (mu, b, d) and in both
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_weights = ((np.log(mu) - bias)[:, np.newaxis] * values
+                       + data[:, np.newaxis] * np.log(values)
+                       - _log_factorial_table(state)(values)
+                       + (xlogy(data, bias) - mu - gammaln(data + 1.0))[:, np.newaxis])
+    zero_weight = _poisson_logpmf(k=0, mu=mu) + _poisson_logpmf(k=data, mu=0)  # log(0) terms
+    log_weights = np.where(values == 0, zero_weight[:, np.newaxis], log_weights)
+    log_weights[values >= (lower + size)[:, np.newaxis]] = -np.inf
+
+    if state.stats is not None:
+        state.stats.record_likelihood('truth', int(size.sum() + approximate.sum()))
+    return {'log_p': log_weights, 'lower': lower, 'approximate': approximate,
+            'mode': mode[approximate], 'sd': sd[approximate],
+            'n_grid': np.maximum(1, 2 * data[approximate].astype(np.int64))}
+
+def _truth_block_sample(log_p, lower, approximate, mode, sd, n_grid, random_state=None):
+    """Draws every value of the truth timeseries, from the candidate values
+    given by `_truth_block_params` (or the normal approximation to the
+    conditional where this is used)."""
+    random_state = np.random.mtrand._rand if random_state is None else random_state
+    values = lower + _categorical_log_rows(log_p, random_state)
+    if approximate.any():
+        values[approximate] = _truth_normal_sample(mode, sd, n_grid, random_state)
+    return values
+
+def truth_block_parameter(value, sampling_freq = 1):
+    """Block parameter object for every index of the truth timeseries.
+    Values are conditionally independent given the data, bias and R values
+    (as lambda is computed from the data), so all are drawn together from
+    one padded array of log weights, in place of a `truth_parameter` for
+    each index. Should be stored under the key 'truth', in place of
+    individual 'truth_' keys.
+
+    Parameters
+    ----------
+    value : array_like
+        Initial values for this parameter object, one per index of the timeseries
+    sampling_freq : int
+        Will sample this parameter 1 in every 'sampling_freq' iterations - 
+        defaults to unity (i.e. sampling every iteration)
+
+    Returns
+    -------
+    GibbsBlock : Parameter object for the truth timeseries
+    """
+    return GibbsBlock(value=value, conditional_posterior=_truth_block_sample,
+                      posterior_params=_truth_block_params, sampling_freq=sampling_freq)
+
+def _gamma_posterior_sample(gamma_params, state):
+    """Single draw from a gamma conditional posterior, whose parameters
+    are computed from the parameter state by `gamma_params`."""
+    return ss.gamma.rvs(**gamma_params(state), random_state=state.random_generator())
+
+def _state_gibbs_parameter(value, sampling_freq, gamma_params):
+    """Creates Gibbs parameter object with a gamma conditional posterior,
+    whose parameters are computed directly from the parameter state.
+
+    Parameters
+    ----------
+    value : float
+        Initial value for this parameter object
+    sampling_freq : int
+        Will sample this parameter 1 in every 'sampling_freq' iterations
+    gamma_params : func
+        Function object that takes the parameter state and returns the
+        parameters of the gamma conditional posterior. Should be defined at
+        module level (or be a `partial` of one) so that the parameter can be
+        pickled for multi-chain runs
+        
+    Returns
+    -------
+    StateGibbsParameter : Parameter object sampled from the parameter state
+    """
+    # Posterior is computed from the state arrays
+    return StateGibbsParameter(value=value, sampling_freq=sampling_freq,
+                               conditional_posterior=partial(_gamma_posterior_sample, gamma_params))
+
+def _truth_block_log_density(values, state):
+    """Log likelihood of given values at every index of the truth timeseries,
+    which are conditionally independent given the data, bias and R values
+    (as lambda is computed from the data). Negative values have zero
+    probability.
+    
+    Parameters
+    ----------
+    values : np.ndarray
+        Values of the truth timeseries, one per index
+    state : ParameterState
+        State object for all inference variables and associated parameters
+        
+    Returns
+    -------
+    np.ndarray : Loglikelihood of the value at each index of the timeseries
     """
-    param = GibbsParameter(value=value, conditional_posterior=None, sampling_freq=sampling_freq)
-    # overwrite sampling method for parameter to use independant sampling
-    param.sample = lambda params : _timeseries_truth_sample(params, index=index)
-    return param
+    counts = np.maximum(values, 0).astype(np.int64)
+    prob_truth = _poisson_logpmf(k=counts, mu=_lambda_values(state) * _r_series(state),
+                                 log_factorial=_log_factorial_table(state))
+    bias = state.bias[np.arange(len(values)) % 7]
+    prob_measurement = _poisson_logpmf(k=state.data, mu=bias * counts)
+    return np.where(values >= 0, prob_truth + prob_measurement, -np.inf)
+
+def truth_metropolis_block_parameter(value, step_size = 1, sampling_freq = 1):
+    """Block parameter object for every index of the truth timeseries,
+    updated together by a componentwise Metropolis step (with integer
+    proposals), rather than by enumerating candidate values at each index.
+    Should be stored under the key 'truth', in place of individual 'truth_' keys.
+
+    Parameters
+    ----------
+    value : array_like
+        Initial values for this parameter object, one per index of the timeseries
+    step_size : float or array_like
+        Standard deviation of the proposal, for every index or for each
+    sampling_freq : int
+        Will sample this parameter 1 in every 'sampling_freq' iterations - 
+        defaults to unity (i.e. sampling every iteration)
+
+    Returns
+    -------
+    MetropolisBlock : Parameter object for the truth timeseries
+    """
+    return MetropolisBlock(value=value, step_size=step_size, log_density=_truth_block_log_density,
+                           sampling_freq=sampling_freq, integer=True)
+
+#  --- WEEKDAY SUMS (for bias parameters) ---
+
+class _WeekdaySums:
+    """Sums of the data, truth and R * lambda values over the indices
+    sharing each bias value (i.e. all indices i with i % 7 == index).
+    Sums are updated in place when single truth or R values change, and
+    recomputed in full only when a sum is read after its inputs have
+    changed in some other way (e.g. a new initial lambda from bias_0).
+    """
+
+    def __init__(self, state):
+        """Subscribes to the families that the sums depend on.
+
+        Parameters
+        ----------
+        state : ParameterState
+            State object for all inference variables and associated parameters
+        """
+        self.state = state
+        self._data = None
+        self._truth = None
+        self._r_lambda = None
+        state.subscribe('data', self._data_changed)
+        state.subscribe('truth', self._truth_changed)
+        state.subscribe('R', self._r_changed)
+        state.subscribe('bias', self._bias_changed)
+
+    @staticmethod
+    def _weekday_sum(values):
+        return np.bincount(np.arange(len(values)) % 7, weights=values, minlength=7)
+
+    @staticmethod
+    def _add(sums, start, stop, delta):
+        """Adds the change in values over indices [start, stop) to the sums"""
+        if stop - start == 1:
+            sums[start % 7] += delta[0]
+        else:
+            np.add.at(sums, np.arange(start, stop) % 7, delta)
+
+    def _data_changed(self, start, stop, old):
+        self._data = self._truth = self._r_lambda = None
+
+    def _truth_changed(self, start, stop, old):
+        if self._truth is not None:
+            self._add(self._truth, start, stop, self.state.truth[start:stop] - old)
+
+    def _r_changed(self, start, stop, old):
+        R_values = self.state.R
+        if self._r_lambda is None:
+            return
+        if len(R_values) != len(self.state.data):  # Last R value extends past its key
+            self._r_lambda = None
+            return
+        lambda_values = _lambda_values(self.state)[start:stop]
+        self._add(self._r_lambda, start, stop, (R_values[start:stop] - old) * lambda_values)
+
+    def _bias_changed(self, start, stop, old):
+        if 'truth' not in self.state.families:  # Truth estimated from bias
+            self._truth = None
+        if start == 0:  # Initial lambda depends on bias_0
+            self._r_lambda = None
+
+    @property
+    def data(self):
+        """Sum of data values for each index of the bias vector"""
+        if self._data is None:
+            self._data = self._weekday_sum(self.state.data.astype(float))
+        return self._data
+
+    @property
+    def truth(self):
+        """Sum of truth values for each index of the bias vector"""
+        if self._truth is None:
+            self._truth = self._weekday_sum(_truth_values(self.state).astype(float))
+        return self._truth
+
+    @property
+    def r_lambda(self):
+        """Sum of R * lambda values for each index of the bias vector"""
+        if self._r_lambda is None:
+            self._r_lambda = self._weekday_sum(_r_series(self.state) * _lambda_values(self.state))
+        return self._r_lambda
+
+
+def _weekday_sums(state):
+    """Weekday sums of data, truth and R * lambda, from the cache held on the state."""
+    return state.cache('weekday_sums', lambda : _WeekdaySums(state))
 
 #  --- POISSON BIAS PARAMETERS ---
 
-def _poisson_bias_pdf_params(index, **kwargs):
+def _poisson_bias_block_params(state):
+    """Parameters for the probability density functions (pdfs) of all
+    seven indices of the bias vector, based on a poisson noise model
+    (C_t = Po(alpha_t * I_t)).
+    
+    Parameters
+    ----------
+    state : ParameterState
+        State object for all inference variables and associated parameters
+        
+    Returns
+    -------
+    dict : Arrays of parameters for the conditional posteriors used in sampling
+    """
+    sums = _weekday_sums(state)
+    gamma_params = {'a': state['bias_prior_alpha'] + sums.data,
+                   'scale': 1 / (state['bias_prior_beta'] + sums.truth)
+                   }  # scale is inverse of beta value
+    
+    return gamma_params
+
+def _poisson_bias_pdf_params(state, index):
     """Parameters for the probability density function (pdf) for 
     a given index of the bias vector, based on a poisson noise model
     (C_t = Po(alpha_t * I_t)).
     
     Parameters
     ----------
+    state : ParameterState
+        State object for all inference variables and associated parameters
     index : int
         Index of bias vector to generate the pdf for
-    kwargs : Unpacked dict
-        Unpacked collection of parameters objects
         
     Returns
     -------
     dict : Parameters for the conditional posterior used in sampling
     """
-    params = kwargs
-
-    unsorted_indicies = [int(k[len('data_'):]) for k in params.keys() if k.startswith('data_')]
-    data_indicies = [k for k in sorted(unsorted_indicies)]
-    data_values = []; truth_values = []
-
-    for i in data_indicies:
-        if int(i) % 7 == index:
-            data_values.append(params['data_' + str(i)])
-            truth_values.append(params['truth_' + str(i)])
-
-    gamma_params = {'a': params['bias_prior_alpha'] + sum(data_values),
-                   'scale': 1 / (params['bias_prior_beta'] + sum(truth_values))
-                   }  # scale is inverse of beta value
-    
-    return gamma_params
+    block_params = _poisson_bias_block_params(state)
+    return {k: v[index] for k, v in block_params.items()}
 
 def poisson_bias_parameter(value, index, sampling_freq = 1):
     """Creates Gibbs parameter object, with a gamma posterior derived
     using conjugate priors above. Function object is created for the
-    correct index, and can be passed the unpacked params dictionary.
+    correct index, and is passed the parameter state when sampled.
     
     Parameters
     ----------
@@ -220,50 +762,76 @@ def poisson_bias_parameter(value, index, sampling_freq = 1):
     -------
     GibbsParameter : Parameter object for given index of bias vector
     """
-    return GibbsParameter(
-        value=value, conditional_posterior=ss.gamma.rvs, sampling_freq=sampling_freq,
-        posterior_params = lambda **kwargs : _poisson_bias_pdf_params(index=index, value=value, **kwargs))
+    return _state_gibbs_parameter(value, sampling_freq,
+                                  partial(_poisson_bias_pdf_params, index=index))
+
+def poisson_bias_block_parameter(value, sampling_freq = 1):
+    """Block parameter object for all seven indices of the bias vector,
+    drawn together in one vectorised gamma call (the bias values are 
+    conditionally independent given the truth timeseries). Should be
+    stored under the key 'bias', in place of individual 'bias_' keys.
+    
+    Parameters
+    ----------
+    value : array_like
+        Initial values for this parameter object, one per index of the bias vector
+    sampling_freq : int
+        Will sample this parameter 1 in every 'sampling_freq' iterations - 
+        defaults to unity (i.e. sampling every iteration)
+        
+    Returns
+    -------
+    GibbsBlock : Parameter object for the bias vector
+    """
+    return GibbsBlock(value=value, conditional_posterior=ss.gamma.rvs,
+                      posterior_params=_poisson_bias_block_params, sampling_freq=sampling_freq)
 
 #  --- SCALE BIAS PARAMETERS ---
 
-def _scale_bias_pdf_params(index, **kwargs):
+def _scale_bias_block_params(state):
+    """Parameters for the probability density functions (pdfs) of all
+    seven indices of the bias vector, based on a scale noise model
+    (deterministic scaling of cases with C_t = alpha_t * I_t)
+    
+    Parameters
+    ----------
+    state : ParameterState
+        State object for all inference variables and associated parameters
+        
+    Returns
+    -------
+    dict : Arrays of parameters for the conditional posteriors used in sampling
+    """
+    sums = _weekday_sums(state)
+    gamma_params = {'a': state['bias_prior_alpha'] + sums.data,
+                   'scale': 1 / (state['bias_prior_beta'] + sums.r_lambda)
+                   }  # scale is inverse of beta value
+    
+    return gamma_params
+
+def _scale_bias_pdf_params(state, index):
     """Parameters for the probability density function (pdf) for 
     a given index of the bias vector, based on a scale noise model
     (deterministic scaling of cases with C_t = alpha_t * I_t)
     
     Parameters
     ----------
+    state : ParameterState
+        State object for all inference variables and associated parameters
     index : int
         Index of bias vector to generate the pdf for
-    kwargs : Unpacked dict
-        Unpacked collection of parameters objects
         
     Returns
     -------
     dict : Parameters for the conditional posterior used in sampling
     """
-    params = kwargs
-
-    unsorted_indicies = [int(k[len('data_'):]) for k in params.keys() if k.startswith('data_')]
-    data_indicies = [k for k in sorted(unsorted_indicies)]
-    R_Lambda_values = []; data_values = []
-
-    for i in data_indicies:
-        if int(i) % 7 == index:
-            data_values.append(params['data_' + str(i)])
-            Lambda_val = _calculate_lambda(params, max_t=i)
-            R_Lambda_values.append(params['R_' + str(i)] * Lambda_val)
-
-    gamma_params = {'a': params['bias_prior_alpha'] + sum(data_values),
-                   'scale': 1 / (params['bias_prior_beta'] + sum(R_Lambda_values))
-                   }  # scale is inverse of beta value
-    
-    return gamma_params
+    block_params = _scale_bias_block_params(state)
+    return {k: v[index] for k, v in block_params.items()}
 
 def scale_bias_parameter(value, index, sampling_freq = 1):
     """Creates Gibbs parameter object, with a gamma posterior derived
     using conjugate priors above. Function object is created for the
-    correct index, and can be passed the unpacked params dictionary.
+    correct index, and is passed the parameter state when sampled.
 
     Should only be used with a variable Rt setup.
     
@@ -281,18 +849,97 @@ def scale_bias_parameter(value, index, sampling_freq = 1):
     -------
     GibbsParameter : Parameter object for given index of bias vector
     """
-    return GibbsParameter(
-        value=value, conditional_posterior=ss.gamma.rvs, sampling_freq=sampling_freq,
-        posterior_params = lambda **kwargs : _scale_bias_pdf_params(index=index, value=value, **kwargs))
+    return _state_gibbs_parameter(value, sampling_freq,
+                                  partial(_scale_bias_pdf_params, index=index))
+
+def scale_bias_block_parameter(value, sampling_freq = 1):
+    """Block parameter object for all seven indices of the bias vector,
+    drawn together in one vectorised gamma call, based on a scale noise
+    model. Should be stored under the key 'bias', in place of individual
+    'bias_' keys, and only used with a variable Rt setup.
+    
+    Parameters
+    ----------
+    value : array_like
+        Initial values for this parameter object, one per index of the bias vector
+    sampling_freq : int
+        Will sample this parameter 1 in every 'sampling_freq' iterations - 
+        defaults to unity (i.e. sampling every iteration)
+        
+    Returns
+    -------
+    GibbsBlock : Parameter object for the bias vector
+    """
+    return GibbsBlock(value=value, conditional_posterior=ss.gamma.rvs,
+                      posterior_params=_scale_bias_block_params, sampling_freq=sampling_freq)
 
 #  --- R PARAMETERS (constant and variable R)---
 
-def _rt_params(initial_index=None, final_index=None, **kwargs):
+class _WindowSums:
+    """Cumulative sums of the truth and lambda timeseries, so that the sum of
+    either over any window of the timeseries is the difference of two entries.
+    Each sum is recomputed (in a single `np.cumsum`) only when read after the
+    series it depends on has changed.
+    """
+
+    def __init__(self, state):
+        """Subscribes to the families that the sums depend on.
+
+        Parameters
+        ----------
+        state : ParameterState
+            State object for all inference variables and associated parameters
+        """
+        self.state = state
+        self._truth = None
+        self._lambda = None
+        state.subscribe('truth', self._truth_changed)
+        state.subscribe('data', self._data_changed)
+        state.subscribe('bias', self._bias_changed)
+
+    def _truth_changed(self, start, stop, old):
+        self._truth = None
+
+    def _data_changed(self, start, stop, old):
+        self._truth = self._lambda = None
+
+    def _bias_changed(self, start, stop, old):
+        if 'truth' not in self.state.families:  # Truth estimated from bias
+            self._truth = None
+        if start == 0:  # Initial lambda depends on bias_0
+            self._lambda = None
+
+    @staticmethod
+    def _cumulative(values):
+        return np.concatenate([[0], np.cumsum(values)])
+
+    @property
+    def truth(self):
+        """Cumulative truth values, where truth[i] is the sum of the first i values"""
+        if self._truth is None:
+            self._truth = self._cumulative(_truth_values(self.state))
+        return self._truth
+
+    @property
+    def lambda_(self):
+        """Cumulative lambda values, where lambda_[i] is the sum of the first i values"""
+        if self._lambda is None:
+            self._lambda = self._cumulative(_lambda_values(self.state))
+        return self._lambda
+
+
+def _window_sums(state):
+    """Cumulative truth and lambda sums, from the cache held on the state."""
+    return state.cache('window_sums', lambda : _WindowSums(state))
+
+def _rt_params(state, initial_index=None, final_index=None):
     """Parameters for the probability density function (pdf) for 
     a single (constant) reproductive number.
     
     Parameters
     ----------
+    state : ParameterState
+        State object for all inference variables and associated parameters
     initial_index : int
         Initial index of timeseries to consider. Pass 'None' if
         the R value is fixed over the simulation, or time varying.
@@ -300,37 +947,56 @@ def _rt_params(initial_index=None, final_index=None, **kwargs):
         Final index of timeseries to consider - given by the current index
         of the timeseries in the case of time-varying Rt. Pass 'None' if
         the R value is fixed over the time period.
-    kwargs : Unpacked dict
-        Unpacked collection of parameters objects
         
     Returns
     -------
     dict : Parameters for the conditional posterior used in sampling
     """
-    params = kwargs
-
     if final_index is None:  # For single R0 case - considers whole timeseries
         window_start = 0
     elif initial_index is not None:  # For constant Rt over between given indices
         window_start = initial_index
     else:  # To compute params for a single index of a time varying Rt 
-        window_start = max(0, final_index-params['Rt_window'])  # Typically -7 for one week
+        window_start = max(0, final_index-state['Rt_window'])  # Typically -7 for one week
         final_index += 1  # So range includes current value
 
-    unsorted_indicies = [int(k[len('data_'):]) for k in params.keys() if k.startswith('data_')]
-    data_indicies = [k for k in sorted(unsorted_indicies)]
-    truth_values = []; gamma_values = []
+    series_len = len(state.data)
+    window_start = min(window_start, series_len)
+    final_index = series_len if final_index is None else min(final_index, series_len)
+
+    sums = _window_sums(state)
+    truth_sum = sums.truth[final_index] - sums.truth[window_start]
+    gamma_sum = sums.lambda_[final_index] - sums.lambda_[window_start]
+
+    gamma_params = {'a': state['rt_prior_alpha'] + truth_sum,
+                   'scale': 1 / (state['rt_prior_beta'] + gamma_sum)
+                   }  # scale is inverse of beta value
+    
+    return gamma_params
+
+def _rt_block_params(state):
+    """Parameters for the probability density functions (pdfs) of
+    every index of the time-varying reproductive number, which are
+    conditionally independent given the truth timeseries.
+    
+    Parameters
+    ----------
+    state : ParameterState
+        State object for all inference variables and associated parameters
+        
+    Returns
+    -------
+    dict : Arrays of parameters for the conditional posteriors used in sampling
+    """
+    final_indices = np.arange(1, len(state.data) + 1)  # Window includes current value
+    window_starts = np.maximum(0, final_indices - 1 - state['Rt_window'])
 
-    for i in data_indicies[window_start:final_index]:
-        gamma_values.append(_calculate_lambda(params, i))
-        try:
-            truth_values.append(params['truth_' + str(i)])
-        except KeyError:
-            truth_values.append(int(params['data_' + str(i)]
-                                    / params['bias_' + str(i % 7)]))
+    sums = _window_sums(state)
+    truth_sums = sums.truth[final_indices] - sums.truth[window_starts]
+    gamma_sums = sums.lambda_[final_indices] - sums.lambda_[window_starts]
 
-    gamma_params = {'a': params['rt_prior_alpha'] + sum(truth_values),
-                   'scale': 1 / (params['rt_prior_beta'] + sum(gamma_values))
+    gamma_params = {'a': state['rt_prior_alpha'] + truth_sums,
+                   'scale': 1 / (state['rt_prior_beta'] + gamma_sums)
                    }  # scale is inverse of beta value
     
     return gamma_params
@@ -351,8 +1017,8 @@ def single_r_parameter(value, sampling_freq = 1):
     -------
     GibbsParameter : Parameter object for constant reproductive number    
         """
-    return GibbsParameter(value=value, conditional_posterior=ss.gamma.rvs, sampling_freq=sampling_freq,
-                            posterior_params=lambda **kwargs : _rt_params(final_index=None, **kwargs))
+    return _state_gibbs_parameter(value, sampling_freq,
+                                  partial(_rt_params, final_index=None))
 
 def constant_r_parameter(value, start, end, sampling_freq = 1):
     """Parameters for the probability density function (pdf) for 
@@ -370,9 +1036,8 @@ def constant_r_parameter(value, start, end, sampling_freq = 1):
     -------
     GibbsParameter : Parameter object for constant reproductive number    
         """
-    return GibbsParameter(value=value, conditional_posterior=ss.gamma.rvs, sampling_freq=sampling_freq,
-                            posterior_params=lambda **kwargs : _rt_params(initial_index=start,
-                                                                          final_index=end, **kwargs))
+    return _state_gibbs_parameter(value, sampling_freq,
+                                  partial(_rt_params, initial_index=start, final_index=end))
 
 def rt_parameter(value, index, sampling_freq = 1):
     """Parameters for the probability density function (pdf) for 
@@ -392,5 +1057,52 @@ def rt_parameter(value, index, sampling_freq = 1):
     -------
     GibbsParameter : Parameter object for constant reproductive number    
         """
-    return GibbsParameter(value=value, conditional_posterior=ss.gamma.rvs, sampling_freq=sampling_freq,
-                          posterior_params=lambda **kwargs : _rt_params(final_index=index, **kwargs))
\ No newline at end of file
+    return _state_gibbs_parameter(value, sampling_freq,
+                                  partial(_rt_params, final_index=index))
+
+def rt_block_parameter(value, sampling_freq = 1):
+    """Block parameter object for every index of the time-varying
+    reproductive number, drawn together in one vectorised gamma call. 
+    Should be stored under the key 'R', in place of individual 'R_' keys.
+    
+    Parameters
+    ----------
+    value : array_like
+        Initial values for this parameter object, one per index of the timeseries
+    sampling_freq : int
+        Will sample this parameter 1 in every 'sampling_freq' iterations - 
+        defaults to unity (i.e. sampling every iteration)
+    
+    Returns
+    -------
+    GibbsBlock : Parameter object for the time-varying reproductive number
+        """
+    return GibbsBlock(value=value, conditional_posterior=ss.gamma.rvs,
+                      posterior_params=_rt_block_params, sampling_freq=sampling_freq)
+
+def _rt_block_log_density(values, state):
+    """Log density of the conditional posterior of given values at every
+    index of the time-varying reproductive number (see `_rt_block_params`)."""
+    return ss.gamma.logpdf(values, **_rt_block_params(state))
+
+def rt_metropolis_block_parameter(value, step_size = 0.1, sampling_freq = 1):
+    """Block parameter object for every index of the time-varying
+    reproductive number, updated together by a componentwise Metropolis
+    step. Should be stored under the key 'R', in place of individual 'R_' keys.
+    
+    Parameters
+    ----------
+    value : array_like
+        Initial values for this parameter object, one per index of the timeseries
+    step_size : float or array_like
+        Standard deviation of the proposal, for every index or for each
+    sampling_freq : int
+        Will sample this parameter 1 in every 'sampling_freq' iterations - 
+        defaults to unity (i.e. sampling every iteration)
+    
+    Returns
+    -------
+    MetropolisBlock : Parameter object for the time-varying reproductive number
+        """
+    return MetropolisBlock(value=value, step_size=step_size, log_density=_rt_block_log_density,
+                           sampling_freq=sampling_freq)
@@ -2,6 +2,9 @@
 # Module for Gibbs sampling
 #
 
-from .gibbs_sampler import GibbsParameter, GibbsSampler
-from .metropolis_sampler import MetropolisParameter, MetropolisSampler
-from .mixed_sampler import MixedSampler
\ No newline at end of file
+from .chain_recorder import ChainRecorder, read_chain
+from .gibbs_sampler import GibbsBlock, GibbsParameter, GibbsSampler, StateGibbsParameter
+from .metropolis_sampler import MetropolisBlock, MetropolisParameter, MetropolisSampler
+from .mixed_sampler import MixedSampler
+from .parameter_state import ParameterState, ParameterValues
+from .sampler_stats import SamplerStats
@@ -0,0 +1,120 @@
+#
+# Streaming storage of sampler output on disk
+#
+
+import json
+import os
+import numpy as np
+import pandas as pd
+
+
+class ChainRecorder:
+    """Records the samples of a chain to a directory on disk, in fixed-size
+    blocks, rather than holding the whole history in memory.
+
+    Each block is a 2D `.npy` array (one row per recorded iteration, one
+    column per recorded value), written as soon as it is full. Column names
+    are stored alongside in `columns.json`, so the chain can be read back
+    with `read_chain` at any point - including while the sampler is still
+    running, in which case all completed blocks are returned. Memory use is
+    bounded by the size of a single block.
+    """
+
+    def __init__(self, path, columns, block_size = 1000):
+        """Constructor method for the recorder. Creates the output directory,
+        removing any blocks left from a previous run.
+
+        Parameters
+        ----------
+        path : str
+            Directory to write the chain to
+        columns : list
+            Names of all values recorded at each iteration
+        block_size : int
+            Number of iterations held in memory before being written to disk
+        """
+        self.path = path
+        self.columns = list(columns)
+        self.block_size = block_size
+        self._index = {name: i for i, name in enumerate(self.columns)}
+        self._buffer = np.full((block_size, len(self.columns)), np.nan)
+        self._rows = 0
+        self.block_num = 0
+
+        os.makedirs(path, exist_ok=True)
+        for filename in _block_files(path):
+            os.remove(os.path.join(path, filename))
+        with open(os.path.join(path, 'columns.json'), 'w') as f:
+            json.dump(self.columns, f)
+
+    def append(self, row):
+        """Adds the values recorded at one iteration, writing the block to
+        disk once it is full. Columns missing from the row are left as NaN.
+
+        Parameters
+        ----------
+        row : dict
+            Mapping of column name to recorded value
+        """
+        buffer_row = self._buffer[self._rows]
+        buffer_row[:] = np.nan
+        for key, value in row.items():
+            buffer_row[self._index[key]] = value
+        self._rows += 1
+        if self._rows == self.block_size:
+            self.flush()
+
+    def flush(self):
+        """Writes any buffered rows to disk as a new block."""
+        if self._rows == 0:
+            return
+        filename = os.path.join(self.path, f"block_{self.block_num:06d}.npy")
+        with open(filename + '.tmp', 'wb') as f:  # Readers never see partial blocks
+            np.save(f, self._buffer[:self._rows])
+        os.replace(filename + '.tmp', filename)
+        self.block_num += 1
+        self._rows = 0
+
+    def truncate(self):
+        """Removes any blocks beyond those written by this recorder (e.g.
+        written after a checkpoint of the recorder was taken)."""
+        for filename in _block_files(self.path)[self.block_num:]:
+            os.remove(os.path.join(self.path, filename))
+
+    def to_dataframe(self):
+        """Reads the recorded chain back from disk.
+
+        Returns
+        -------
+        pd.DataFrame : All samples written so far
+        """
+        return read_chain(self.path)
+
+
+def _block_files(path):
+    """Sorted names of all completed blocks in a chain directory."""
+    return sorted(f for f in os.listdir(path)
+                  if f.startswith('block_') and f.endswith('.npy'))
+
+
+def read_chain(path):
+    """Reads a chain written by `ChainRecorder` from disk, in the same layout
+    as returned by `MixedSampler.sampling_routine`.
+
+    Parameters
+    ----------
+    path : str
+        Directory the chain was written to
+
+    Returns
+    -------
+    pd.DataFrame : All samples in completed blocks of the chain
+    """
+    with open(os.path.join(path, 'columns.json')) as f:
+        columns = json.load(f)
+    blocks = [np.load(os.path.join(path, filename)) for filename in _block_files(path)]
+    values = np.concatenate(blocks) if blocks else np.zeros((0, len(columns)))
+    chain = pd.DataFrame(values, columns=columns)
+    if 'Chain' in chain:
+        chain['Chain'] = chain['Chain'].astype(int)
+    return chain
@@ -3,17 +3,23 @@
 #
 
 import random
+import time
+import numpy as np
 import pandas as pd
 
+try:
+    from .parameter_state import ParameterState, StoredParameter, current_values
+    from .sampler_stats import SamplerStats
+except ImportError:  # Imported as a standalone module, as in `exampler.ipynb`
+    from parameter_state import ParameterState, StoredParameter, current_values
+    from sampler_stats import SamplerStats
 
-class GibbsParameter(float):
-    """Parameter object for Gibbs sampler.
+
+class GibbsParameter(StoredParameter):
+    """Parameter object for Gibbs sampler. Once added to a ParameterState,
+    its value is read from (and written to) the storage of the state.
     """
-    def __new__(cls, value, conditional_posterior, posterior_params = None,
-                sampling_freq = 1):
-        """Inherits from float class, so instances of Parameter will be treated as a
-        float (of value self.value) in all arithmetic operations."""
-        return super(GibbsParameter, cls).__new__(cls, value)
+    __slots__ = ('conditional_posterior', 'posterior_params', 'sampling_freq')
 
     def __init__(self, value, conditional_posterior, posterior_params = None,
                  sampling_freq = 1):
@@ -33,7 +39,7 @@ class GibbsParameter(float):
             Will sample this parameter 1 in every 'sampling_freq' iterations - 
             defaults to unity (i.e. sampling every iteration)
         """
-        self.value = value
+        super().__init__(value)
         self.conditional_posterior = conditional_posterior
         self.posterior_params = posterior_params
         self.sampling_freq = sampling_freq
@@ -59,11 +65,13 @@ class GibbsParameter(float):
         return str(self.value)
 
     def sample(self, sample_params):
-        """Samples from the conditional posterior distribution.
+        """Samples from the conditional posterior distribution. Functions
+        are passed the current values of the arguments they name, read
+        from a live view of the parameters (see `ParameterValues`).
         
         Parameters
         ----------
-        sample_params : dict
+        sample_params : dict or ParameterState
             Dictionary of the all current parameter values, required
             to generate the shape of the posterior distribution.
 
@@ -72,40 +80,137 @@ class GibbsParameter(float):
         float
             Value of parameter sampled from conditional posterior
         """
+        values = current_values(sample_params)
         if self.posterior_params is None:
             # Can directly feed params into conditional_posterior
-            post_params = sample_params
+            post_params = values.arguments(self.conditional_posterior)
         else:
-            param_values = {}
-            for k, v in sample_params.items():
-                if isinstance(v, GibbsParameter):
-                    param_values[k] = v.value
-                else:
-                    param_values[k] = v
-            post_params = self.posterior_params(**param_values)
-        self.value = self.conditional_posterior(**post_params)
-        return self.value
+            post_params = self.posterior_params(**values.arguments(self.posterior_params))
+        return self.conditional_posterior(**post_params)
+
+
+class StateGibbsParameter(GibbsParameter):
+    """Gibbs parameter whose conditional posterior reads the parameter
+    state directly (e.g. its family arrays), rather than being passed
+    the values of named parameters.
+    """
+    __slots__ = ()
+
+    def __init__(self, value, conditional_posterior, sampling_freq = 1):
+        """Constructor method of parameter object.
+        
+        Parameters
+        ----------
+        value : float
+            The initial value of the parameter
+        conditional_posterior : func
+            Function object that takes the ParameterState and returns a
+            random sample. Should be defined at module level (or be a
+            `partial` of one) so that the parameter can be pickled
+        sampling_freq : int
+            Will sample this parameter 1 in every 'sampling_freq' iterations - 
+            defaults to unity (i.e. sampling every iteration)
+        """
+        super().__init__(value, conditional_posterior, sampling_freq=sampling_freq)
+
+    def sample(self, state):
+        """Samples from the conditional posterior distribution.
+        
+        Parameters
+        ----------
+        state : ParameterState
+            State of all current parameter values
+
+        Returns
+        -------
+        float
+            Value of parameter sampled from conditional posterior
+        """
+        return self.conditional_posterior(state)
+
+
+class GibbsBlock(StoredParameter):
+    """Parameter object for a joint Gibbs update of a whole family of
+    conditionally independent parameters (e.g. every R_t value given the
+    truth timeseries), which are all drawn in one vectorised call.
+
+    The block is stored in the params dictionary under the family name (e.g.
+    'R'), in place of the individual indexed keys, and its samples are
+    recorded under the indexed names ('R_0', 'R_1', ...).
+    """
+    __slots__ = ('conditional_posterior', 'posterior_params', 'sampling_freq')
+
+    def __init__(self, value, conditional_posterior, posterior_params,
+                 sampling_freq = 1):
+        """Constructor method of block parameter object.
+        
+        Parameters
+        ----------
+        value : array_like
+            The initial values of the parameters, one per index of the family
+        conditional_posterior : func
+            Function object that returns an array of random samples from a
+            known distribution, and accepts a `random_state` argument
+            (e.g. `ss.gamma.rvs`)
+        posterior_params : func
+            Function object that takes the parameter state and returns a
+            dictionary of arrays, to be passed to the conditional_posterior
+        sampling_freq : int
+            Will sample this block 1 in every 'sampling_freq' iterations - 
+            defaults to unity (i.e. sampling every iteration)
+        """
+        super().__init__(np.array(value, dtype=float))
+        self.conditional_posterior = conditional_posterior
+        self.posterior_params = posterior_params
+        self.sampling_freq = sampling_freq
+
+    def __str__(self) -> str:
+        return (f"Gibbs Block of {len(self.value)} values")
+
+    def __repr__(self) -> str:
+        return str(self.value)
+
+    def sample(self, state):
+        """Samples all values of the block from the conditional posterior.
+        
+        Parameters
+        ----------
+        state : ParameterState
+            State of all current parameter values
+
+        Returns
+        -------
+        np.ndarray
+            Values of the parameters sampled from the conditional posterior
+        """
+        samples = self.conditional_posterior(**self.posterior_params(state),
+                                             random_state=state.random_generator())
+        return np.asarray(samples, dtype=float)
 
 
 class GibbsSampler:
     """Sampling class using Gibbs methods"""
 
-    def __init__(self, params):
+    def __init__(self, params, stats = None):
         """Constructor object, takes dictionary of parameters
         
         Parameters
         ----------
-        params : Dict
+        params : Dict or ParameterState
             Dictionary of all parameters + constants required for 
             calculating conditional posterior distributions. Parameters 
             that will be updated should be instances of the Parameter class.
+            Dictionaries are converted to an array-backed ParameterState.
+        stats : SamplerStats
+            If this is specified, the time taken by each update is recorded
         """
-        self.params = params
+        self.params = ParameterState.from_params(params)
+        self.stats = stats
 
     def single_sample(self, param_name):
         """Runs single sample of a parameter, updating the value 
-        inplace in the params dictionary and returning the updated value
-        for recording.
+        inplace in the parameter state (which the Parameter object reads
+        from) and returning the updated value for recording.
         
         Parameters
         ----------
@@ -113,13 +218,19 @@ class GibbsSampler:
             Key from params dictionary corresponding to Parameter
             instance to sample from.
         """
-        assert isinstance(self.params[param_name], GibbsParameter), \
+        assert isinstance(self.params[param_name], (GibbsParameter, GibbsBlock)), \
             "Parameter name supplied must correspond to Parameter instance"
-        value = self.params[param_name].sample(self.params)
-        self.params[param_name].value = value
+        if self.stats is None:
+            value = self.params[param_name].sample(self.params)
+        else:
+            start = time.perf_counter()
+            value = self.params[param_name].sample(self.params)
+            self.stats.record_sample(param_name, time.perf_counter() - start)
+        self.params.set_value(param_name, value)
         return value
 
-    def sampling_routine(self, step_num, sample_period = 1, sample_burnin = 0):
+    def sampling_routine(self, step_num, sample_period = 1, sample_burnin = 0,
+                         instrument = False):
         """Conducts N iterations of a Gibbs Sampler.
         
         Parameters
@@ -132,16 +243,28 @@ class GibbsSampler:
         sample_burnin : int
             Interations before recording, to allow the stationary
             distribution to be reached
+        instrument : bool
+            Whether to record timing and acceptance statistics (see
+            `SamplerStats`), which are returned alongside the samples
+
+        Returns
+        -------
+        pd.DataFrame : Recorded samples, or a tuple of the samples and
+            SamplerStats if `instrument` is set
         """
+        if instrument:
+            self.stats = self.params.stats = SamplerStats()
         params = self.params
         history = []
         for n in range(step_num):
             row = {}
             random.shuffle(list(params.keys()))
             for key in list(params.keys()):
-                if isinstance(params[key], GibbsParameter):
+                if isinstance(params[key], (GibbsParameter, GibbsBlock)):
                     if n % params[key].sampling_freq == 0:
-                        row[key] = self.single_sample(key)
+                        row.update(params.labelled(key, self.single_sample(key)))
             if ((n >= sample_burnin) & (n % sample_period == 0)):
                 history.append(row)
+        if instrument:
+            return pd.DataFrame(history), self.stats
         return pd.DataFrame(history)
\ No newline at end of file
@@ -3,20 +3,28 @@
 #
 
 import math
+import time
 import numpy as np
 import pandas as pd
 import scipy.stats as ss
 
+try:
+    from .parameter_state import ParameterState, StoredParameter
+    from .sampler_stats import SamplerStats
+except ImportError:  # Imported as a standalone module, as in `exampler.ipynb`
+    from parameter_state import ParameterState, StoredParameter
+    from sampler_stats import SamplerStats
 
-class MetropolisParameter(float):
-    """Parameter object for Metropolis sampler.
+
+class MetropolisParameter(StoredParameter):
+    """Parameter object for Metropolis sampler. Once added to a ParameterState,
+    its value is read from (and written to) the storage of the state.
     """
-    def __new__(cls, value, **kwargs):
-        """Inherits from float class, so instances of Parameter will be treated as a
-        float (of value self.value) in all arithmetic operations."""
-        return super(MetropolisParameter, cls).__new__(cls, value)
+    __slots__ = ('step_size', 'prior', 'likelihood', 'sampling_freq',
+                 'log_prior', 'log_likelihood', 'proposal_value', 'proposal_func')
 
-    def __init__(self, value, step_size, prior, likelihood, sampling_freq = 1):
+    def __init__(self, value, step_size, prior, likelihood, sampling_freq = 1,
+                 log_prior = None, log_likelihood = None):
         """Constructor method of parameter object.
         
         Parameters
@@ -36,22 +44,55 @@ class MetropolisParameter(float):
         sampling_freq : int
             Will sample this parameter 1 in every 'sampling_freq' iterations - 
             defaults to unity (i.e. sampling every iteration)
+        log_prior : func
+            Optional function object that returns the log of the prior pdf,
+            used in place of log(prior) - e.g. `ss.gamma(a=2).logpdf`
+        log_likelihood : func
+            Optional function object that returns the log of the likelihood,
+            used in place of log(likelihood) to avoid underflow for large data
         """
-        self.value = value
+        super().__init__(value)
         self.step_size = step_size
         self.prior = prior
         self.likelihood = likelihood
         self.sampling_freq = sampling_freq
+        self.log_prior = log_prior
+        self.log_likelihood = log_likelihood
 
         # Default proposal functions - can be redefined for Metropolis Hastings
+        # by assigning a function object to the attribute of the same name
+        self.proposal_value = self._normal_proposal_value
+        self.proposal_func = self._normal_proposal_func
 
-        #   Function to sample from distribution (to propose new value)
-        self.proposal_value = lambda loc : (ss.norm.rvs(loc, scale=step_size) % 1)
+    def _normal_proposal_value(self, loc):
+        """Function to sample from distribution (to propose new value)"""
+        return ss.norm.rvs(loc, scale=self.step_size) % 1
 
-        #   Function to generate pdf (for J(theta_1 | theta_2) in acceptance prob)
-        #      Should be of the form f(x, y) to calculate P(x | y)
-        self.proposal_func = lambda x, loc : ss.norm.pdf(x, loc, scale=step_size)
+    def _normal_proposal_func(self, x, loc):
+        """Function to generate pdf (for J(theta_1 | theta_2) in acceptance prob).
+        Should be of the form f(x, y) to calculate P(x | y)"""
+        return ss.norm.pdf(x, loc, scale=self.step_size)
 
+    def log_posterior(self, value, arguments):
+        """Unnormalised log posterior density of a value of the parameter.
+        
+        Parameters
+        ----------
+        value : float
+            Value of the parameter
+        arguments : dict
+            Keyword arguments for the likelihood, including this parameter
+
+        Returns
+        -------
+        float : Log of prior x likelihood (-inf where either is zero)
+        """
+        with np.errstate(divide='ignore'):
+            log_prior = (np.log(self.prior(value)) if self.log_prior is None
+                         else self.log_prior(value))
+            log_likelihood = (np.log(self.likelihood(**arguments)) if self.log_likelihood is None
+                              else self.log_likelihood(**arguments))
+        return float(log_prior + log_likelihood)
 
     def __str__(self) -> str:
         """String representation of object.
@@ -74,24 +115,129 @@ class MetropolisParameter(float):
         return str(self.value)
 
 
+class MetropolisBlock(StoredParameter):
+    """Parameter object for a componentwise Metropolis update of a whole
+    family of conditionally independent parameters (e.g. every R_t value,
+    or every truth value, given the rest of the state).
+
+    All components are proposed together from a normal random walk, and
+    each is accepted or rejected separately from one vectorised evaluation
+    of the log density. As for a GibbsBlock, the block is stored in the
+    params dictionary under the family name (e.g. 'R'), and its samples are
+    recorded under the indexed names ('R_0', 'R_1', ...).
+    """
+    __slots__ = ('step_size', 'log_density', 'sampling_freq', 'integer')
+
+    def __init__(self, value, step_size, log_density, sampling_freq = 1,
+                 integer = False):
+        """Constructor method of block parameter object.
+        
+        Parameters
+        ----------
+        value : array_like
+            The initial values of the parameters, one per index of the family
+        step_size : float or array_like
+            Step size of the proposal for every component, or for each
+        log_density : func
+            Function object that takes an array of values for the block and
+            the parameter state, and returns the unnormalised log posterior
+            density of each component (given the rest of the state). Should
+            be defined at module level (or be a `partial` of one) so that the
+            parameter can be pickled
+        sampling_freq : int
+            Will sample this block 1 in every 'sampling_freq' iterations - 
+            defaults to unity (i.e. sampling every iteration)
+        integer : bool
+            Whether the parameters take integer values, in which case
+            proposals are rounded to the nearest integer (which keeps the
+            proposal symmetric)
+        """
+        super().__init__(np.array(value, dtype=float))
+        self.step_size = np.full(len(self._value), step_size, dtype=float)
+        self.log_density = log_density
+        self.sampling_freq = sampling_freq
+        self.integer = integer
+
+    def proposal_value(self, values, normals):
+        """Proposed values for every component, from standard normal draws"""
+        proposed = values + self.step_size * normals
+        return np.round(proposed) if self.integer else proposed
+
+    def __str__(self) -> str:
+        return (f"Metropolis Block of {len(self.value)} values")
+
+    def __repr__(self) -> str:
+        return str(self.value)
+
+
+_NORMAL_BLOCK_SIZE = 1024  # Standard normals drawn at once for proposals
+
+
+class _NormalBuffer:
+    """Block of standard normal draws, pre-generated for the default
+    proposals so that each proposal is a single array read. Held in the
+    cache of the parameter state, so that it is saved with checkpoints."""
+
+    def __init__(self):
+        self.values = np.empty(0)
+        self.position = 0
+
+    def draw(self, rng):
+        if self.position == len(self.values):
+            self.values = rng.standard_normal(_NORMAL_BLOCK_SIZE)
+            self.position = 0
+        self.position += 1
+        return self.values[self.position - 1]
+
+
 class MetropolisSampler:
     """Sampling class using Gibbs methods"""
 
-    def __init__(self, params):
+    def __init__(self, params, stats = None):
         """Constructor object, takes dictionary of parameters
         
         Parameters
         ----------
-        params : Dict
+        params : Dict or ParameterState
             Dictionary of all parameters + constants required for 
             calculating conditional posterior distributions. Parameters 
             that will be updated should be instances of the Parameter class.
+            Dictionaries are converted to an array-backed ParameterState.
+        stats : SamplerStats
+            If this is specified, the time taken by each update is recorded
+        """
+        self.params = ParameterState.from_params(params)
+        self.stats = stats
+        self._log_posteriors = {}  # name -> (value, versions of arguments, log posterior)
+        self.target_acceptance = None  # If set, step sizes are tuned towards this rate
+
+    def _adapt_step(self, param_name, param, accepted):
+        """Tunes the step size of a parameter towards the target acceptance
+        rate, by a Robbins-Monro update of its logarithm (with decreasing
+        gain, so the adaptation settles). Accepts an array of outcomes for
+        a block, whose components are tuned separately.
+
+        Parameters
+        ----------
+        param_name : str
+            Key from params dictionary corresponding to Parameter
+        param : MetropolisParameter or MetropolisBlock
+            The parameter that was updated
+        accepted : bool or np.ndarray
+            Whether each proposal was accepted
         """
-        self.params = params
+        counts = self.params.cache('step_adaptation', dict)  # Saved with checkpoints
+        counts[param_name] = counts.get(param_name, 0) + 1
+        gain = counts[param_name] ** -0.6
+        param.step_size = param.step_size * np.exp(gain * (accepted - self.target_acceptance))
 
     def _acceptance_decision(self, param_name, old_value, new_value):
         """Determines whether to accept a given proposed value, compared to
-        the old value, for a named parameter.
+        the old value, for a named parameter. The comparison is made in log
+        space, and the log posterior of the current value is reused from the
+        previous decision unless any argument of the likelihood has changed
+        (the likelihood should only depend on its arguments). This is not
+        possible where the likelihood takes `**kwargs`.
         
         Parameters
         ----------
@@ -109,19 +255,41 @@ class MetropolisSampler:
             (out of [old_value, new_value]).
         """
         param = self.params[param_name]
-        other_params = self.params.copy(); other_params.pop(param_name)
-        old_posterior = param.prior(old_value) * param.likelihood(**{param_name: old_value}, **other_params)
-        new_posterior = param.prior(new_value) * param.likelihood(**{param_name: new_value}, **other_params)
+        view = self.params.view
+        arguments = view.arguments(param.likelihood)  # Read without copying the state
+        names = view.argument_names(param.likelihood)
+        versions = None if names is None else \
+            self.params.versions(name for name in names if name != param_name)
+
+        cached = self._log_posteriors.get(param_name)
+        if versions is not None and cached is not None and cached[:2] == (old_value, versions):
+            old_log_posterior, evaluations = cached[2], 1
+        else:
+            arguments[param_name] = old_value
+            old_log_posterior, evaluations = param.log_posterior(old_value, arguments), 2
+        arguments[param_name] = new_value
+        new_log_posterior = param.log_posterior(new_value, arguments)
+
+        log_r = new_log_posterior - old_log_posterior
+        if param.proposal_func != param._normal_proposal_func:  # Normal pdf is symmetric
+            with np.errstate(divide='ignore'):
+                log_r += (np.log(param.proposal_func(old_value, new_value))
+                          - np.log(param.proposal_func(new_value, old_value)))
+        # Accepts with probability min(r, 1), as floor(min(r, 1) + u)
+        accept = math.log1p(-self.params.random_generator().random()) <= log_r
+        if self.stats is not None:
+            self.stats.record_likelihood(param_name, evaluations)
+            self.stats.record_acceptance(param_name, accept)
 
-        hastings_correction = (param.proposal_func(old_value, new_value)
-                               / param.proposal_func(new_value, old_value))
-        r = min((new_posterior / old_posterior) * hastings_correction, 1)
-        decision = math.floor(r + np.random.random())
-        return [old_value, new_value][decision]
+        value, log_posterior = (new_value, new_log_posterior) if accept \
+            else (old_value, old_log_posterior)
+        if versions is not None:
+            self._log_posteriors[param_name] = (value, versions, log_posterior)
+        return value
 
     def single_sample(self, param_name):
         """Runs single sample of a parameter, updating the value 
-        inplace in the params dictionary and returning the updated value
+        inplace in the parameter state and returning the updated value
         for recording.
         
         Parameters
@@ -130,15 +298,65 @@ class MetropolisSampler:
             Key from params dictionary corresponding to Parameter
             instance to sample from.
         """
-        assert isinstance(self.params[param_name], MetropolisParameter), \
+        assert isinstance(self.params[param_name], (MetropolisParameter, MetropolisBlock)), \
             "Parameter name supplied must correspond to Parameter instance"
-        old_value = self.params[param_name].value
-        proposed_value = self.params[param_name].proposal_value(old_value)
+        start = time.perf_counter()
+        param = self.params[param_name]
+        if isinstance(param, MetropolisBlock):
+            value = self._block_sample(param_name, param)
+            if self.stats is not None:
+                self.stats.record_sample(param_name, time.perf_counter() - start)
+            return value
+        old_value = param.value
+        if param.proposal_value == param._normal_proposal_value:  # From pre-generated normals
+            normals = self.params.cache('proposal_normals', _NormalBuffer)
+            proposed_value = (old_value + param.step_size
+                              * normals.draw(self.params.random_generator())) % 1
+        else:
+            proposed_value = param.proposal_value(old_value)
         value = self._acceptance_decision(param_name, old_value, proposed_value)
-        self.params[param_name].value = value
+        if value is not old_value:  # Rejections leave the state (and cached posteriors) unchanged
+            self.params.set_value(param_name, value)
+        if self.target_acceptance is not None:
+            self._adapt_step(param_name, param, value is not old_value)
+        if self.stats is not None:
+            self.stats.record_sample(param_name, time.perf_counter() - start)
         return value
 
-    def sampling_routine(self, step_num, sample_period = 1, sample_burnin = 0):
+    def _block_sample(self, param_name, param):
+        """Componentwise update of a MetropolisBlock, proposing every
+        component at once and accepting each separately in log space.
+
+        Parameters
+        ----------
+        param_name : str
+            Key from params dictionary corresponding to the block
+        param : MetropolisBlock
+            The block to update
+
+        Returns
+        -------
+        np.ndarray : Values of the block taken forward
+        """
+        rng = self.params.random_generator()
+        old_values = np.array(param.value)  # Copy, as the family array is updated in place
+        new_values = param.proposal_value(old_values, rng.standard_normal(len(old_values)))
+        with np.errstate(invalid='ignore'):  # Proposals outside the support (-inf) are rejected
+            log_r = (param.log_density(new_values, self.params)
+                     - param.log_density(old_values, self.params))
+            accepted = np.log1p(-rng.random(len(old_values))) <= log_r
+        values = np.where(accepted, new_values, old_values)
+        if accepted.any():
+            self.params.set_value(param_name, values)
+        if self.stats is not None:
+            self.stats.record_likelihood(param_name, 2 * len(values))
+            self.stats.record_acceptance(param_name, accepted.sum(), len(values))
+        if self.target_acceptance is not None:
+            self._adapt_step(param_name, param, accepted)
+        return values
+
+    def sampling_routine(self, step_num, sample_period = 1, sample_burnin = 0,
+                         instrument = False, target_acceptance = None):
         """Conducts repeated iterations of a Metropolis-Hastings Sampler.
         
         Parameters
@@ -151,15 +369,32 @@ class MetropolisSampler:
         sample_burnin : int
             Interations before recording, to allow the stationary
             distribution to be reached
+        instrument : bool
+            Whether to record timing and acceptance statistics (see
+            `SamplerStats`), which are returned alongside the samples
+        target_acceptance : float
+            If this is specified, step sizes are tuned towards this
+            acceptance rate (e.g. 0.44 for a single parameter) over the
+            burn-in iterations, and fixed thereafter
+
+        Returns
+        -------
+        pd.DataFrame : Recorded samples, or a tuple of the samples and
+            SamplerStats if `instrument` is set
         """
+        if instrument:
+            self.stats = self.params.stats = SamplerStats()
         params = self.params
         history = []
         for n in range(step_num):
+            self.target_acceptance = target_acceptance if n < sample_burnin else None
             row = {}
             for key in list(params.keys()):
-                if isinstance(params[key], MetropolisParameter):
+                if isinstance(params[key], (MetropolisParameter, MetropolisBlock)):
                     if n % params[key].sampling_freq == 0:
-                        row[key] = self.single_sample(key)
+                        row.update(params.labelled(key, self.single_sample(key)))
             if ((n >= sample_burnin) & (n % sample_period == 0)):
                 history.append(row)
+        if instrument:
+            return pd.DataFrame(history), self.stats
         return pd.DataFrame(history)
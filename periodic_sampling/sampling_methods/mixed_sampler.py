@@ -2,33 +2,51 @@
 # Classes for the Metropolis-Hastings sampler
 #
 
+import copy
+import os
+import pickle
 import random
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 
-from .gibbs_sampler import GibbsParameter, GibbsSampler
-from .metropolis_sampler import MetropolisParameter, MetropolisSampler
+from .chain_recorder import ChainRecorder
+from .gibbs_sampler import GibbsBlock, GibbsParameter, GibbsSampler
+from .metropolis_sampler import MetropolisBlock, MetropolisParameter, MetropolisSampler
+from .parameter_state import ParameterState
+from .sampler_stats import SamplerStats
 
 
 class MixedSampler:
     """Sampling class allowing use of both Gibbs and Metropolis
     methods depedant on the parameter type."""
 
-    def __init__(self, params):
+    def __init__(self, params, rng = None):
         """Constructor object, takes dictionary of parameters
         
         Parameters
         ----------
-        params : Dict
+        params : Dict or ParameterState
             Dictionary of all parameters + constants required for 
             calculating conditional posterior distributions. Parameters 
             that will be updated should be instances of the Parameter class.
+            Dictionaries are converted to an array-backed ParameterState,
+            shared by the Gibbs and Metropolis samplers.
+        rng : np.random.Generator
+            Random number generator used for all draws - if not given,
+            NumPy's global random state is used (as set by `np.random.seed`)
         """
-        self.params = params
+        self.params = ParameterState.from_params(params)
+        if rng is not None:
+            self.params.rng = rng
 
 
     def sampling_routine(self, step_num, sample_period = 1,
-                         sample_burnin = 0, random_order = False, chain_num = None):
+                         sample_burnin = 0, random_order = False, chain_num = None,
+                         display_progress = True, output_path = None, block_size = 1000,
+                         checkpoint_path = None, checkpoint_interval = 1000,
+                         instrument = False, target_acceptance = None):
         """Conducts repeated sampling iterations using either the Gibbs or 
         Metropolis-Hastings methods.
         
@@ -48,27 +66,117 @@ class MixedSampler:
         chain_num : int
             If this is specified, will record the chain number in output 
             Dataframe for use in analysis
+        display_progress : bool
+            Whether to show a progress bar over the iterations
+        output_path : str
+            If this is specified, samples are streamed to this directory in
+            blocks (see `ChainRecorder`) instead of being held in memory
+        block_size : int
+            Number of samples held in memory between writes to `output_path`
+        checkpoint_path : str
+            If this is specified, a snapshot of the sampler is saved to this
+            file every `checkpoint_interval` iterations, from which the
+            run can be continued with `MixedSampler.resume`
+        checkpoint_interval : int
+            Number of iterations between checkpoints
+        instrument : bool
+            Whether to record the time spent on each parameter family,
+            likelihood evaluations and Metropolis acceptance rates (see
+            `SamplerStats`), which are returned alongside the samples
+        target_acceptance : float
+            If this is specified, the step sizes of Metropolis parameters are
+            tuned towards this acceptance rate over the burn-in iterations
+
+        Returns
+        -------
+        pd.DataFrame : Recorded samples, or a ChainRecorder for the
+            directory they were written to if `output_path` is given.
+            If `instrument` is set, a tuple of this and the SamplerStats
+        """
+        if output_path is None:
+            history = []
+        else:
+            history = ChainRecorder(output_path, self._recorded_columns(chain_num),
+                                    block_size=block_size)
+        settings = {'step_num': step_num, 'sample_period': sample_period,
+                    'sample_burnin': sample_burnin, 'random_order': random_order,
+                    'chain_num': chain_num, 'checkpoint_path': checkpoint_path,
+                    'checkpoint_interval': checkpoint_interval,
+                    'target_acceptance': target_acceptance}
+        self.params.stats = SamplerStats() if instrument else None
+        return self._iterate(0, history, settings, display_progress)
+
+    @classmethod
+    def resume(cls, checkpoint_path, display_progress = True):
+        """Continues a run of `sampling_routine` from the last checkpoint
+        saved to the given file. The random states, parameter values and
+        recorded samples are restored exactly, so the output is identical to
+        that of an uninterrupted run.
+
+        Parameters
+        ----------
+        checkpoint_path : str
+            File the checkpoint was saved to
+        display_progress : bool
+            Whether to show a progress bar over the remaining iterations
+
+        Returns
+        -------
+        pd.DataFrame : Recorded samples over the whole run, or a
+            ChainRecorder if the run was streamed to disk
         """
-        metropolis = MetropolisSampler(self.params)
-        gibbs = GibbsSampler(self.params)
+        with open(checkpoint_path, 'rb') as f:
+            checkpoint = pickle.load(f)
+        np.random.set_state(checkpoint['numpy_state'])
+        random.setstate(checkpoint['random_state'])
+
+        sampler = cls(checkpoint['params'])
+        history = checkpoint['history']
+        if isinstance(history, ChainRecorder):
+            history.truncate()  # Blocks written after the checkpoint
+        return sampler._iterate(checkpoint['iteration'], history,
+                                checkpoint['settings'], display_progress)
+
+    def _save_checkpoint(self, iteration, history, settings):
+        """Saves everything required to continue the run after the given
+        number of completed iterations."""
+        if isinstance(history, ChainRecorder):
+            history.flush()  # So the checkpoint only refers to data on disk
+        checkpoint = {'iteration': iteration, 'params': self.params,
+                      'history': history, 'settings': settings,
+                      'numpy_state': np.random.get_state(),
+                      'random_state': random.getstate()}
+        path = settings['checkpoint_path']
+        with open(path + '.tmp', 'wb') as f:  # Never leave a partial checkpoint
+            pickle.dump(checkpoint, f)
+        os.replace(path + '.tmp', path)
+
+    def _iterate(self, start, history, settings, display_progress):
+        """Sampling iterations of `sampling_routine`, from a given iteration."""
+        stats = self.params.stats  # Restored with the state on resuming
+        metropolis = MetropolisSampler(self.params, stats=stats)
+        gibbs = GibbsSampler(self.params, stats=stats)
 
         params = self.params
-        history = []
-        for n in tqdm(range(step_num)):
+        step_num, sample_period = settings['step_num'], settings['sample_period']
+        sample_burnin, random_order = settings['sample_burnin'], settings['random_order']
+        chain_num, checkpoint_path = settings['chain_num'], settings['checkpoint_path']
+        for n in tqdm(range(start, step_num), initial=start, total=step_num,
+                      disable=not display_progress):
             row = {}
+            if n < sample_burnin:  # Step sizes are only tuned during burn-in
+                metropolis.target_acceptance = settings.get('target_acceptance')
+            else:
+                metropolis.target_acceptance = None
             if random_order:
                 random.shuffle(list(params.keys()))
             for key in list(params.keys()):
-                if isinstance(params[key], MetropolisParameter):
+                if isinstance(params[key], (MetropolisParameter, MetropolisBlock)):
                     if n % params[key].sampling_freq == 0:
-                        metropolis.params = self.params  # Resync with global params
-                        row[key] = metropolis.single_sample(key)
-                        self.params[key].value = row[key]  # Update global params
-                elif isinstance(params[key], GibbsParameter):
+                        row.update(params.labelled(key, metropolis.single_sample(key)))  # Updates shared state
+                elif isinstance(params[key], (GibbsParameter, GibbsBlock)):
                     if n % params[key].sampling_freq == 0:
-                        gibbs.params = self.params
-                        row[key] = gibbs.single_sample(key)
-                        self.params[key].value = row[key]
+                        row.update(params.labelled(key, gibbs.single_sample(key)))
 
             # bias_sum = sum([row[key] for key in params.keys() if (key.startswith('bias_') and not key.startswith('bias_prior'))])
             
@@ -98,4 +206,130 @@ class MixedSampler:
                     row['Chain'] = chain_num
                 history.append(row)
 
-        return pd.DataFrame(history)
+            if checkpoint_path is not None and (n + 1) % settings['checkpoint_interval'] == 0:
+                self._save_checkpoint(n + 1, history, settings)
+
+        if isinstance(history, ChainRecorder):
+            history.flush()
+        else:
+            history = pd.DataFrame(history)
+        if stats is not None:
+            return history, stats
+        return history
+
+    def _recorded_columns(self, chain_num = None):
+        """Names of all values that may be recorded at each iteration."""
+        params = self.params
+        columns = [name for key in params
+                   if isinstance(params[key], (MetropolisParameter, MetropolisBlock,
+                                               GibbsParameter, GibbsBlock))
+                   for name in params.labelled(key, params[key].value)]
+        if chain_num is not None:
+            columns.append('Chain')
+        return columns
+
+    def multi_chain_routine(self, chain_num, step_num, sample_period = 1,
+                            sample_burnin = 0, random_order = False, seed = None,
+                            processes = None, initial_values = None, output_path = None,
+                            block_size = 1000, checkpoint_path = None, checkpoint_interval = 1000,
+                            instrument = False, target_acceptance = None):
+        """Runs several independent chains from the current parameters, in
+        parallel over a pool of worker processes.
+
+        Each chain draws from its own `np.random.Generator`, spawned from a
+        single `np.random.SeedSequence`, so the output depends only on the
+        seed - not on the number of processes or the order in which
+        chains finish. All parameter objects (including any function objects
+        they hold) must be picklable to be sent to the workers.
+
+        Parameters
+        ----------
+        chain_num : int
+            Number of chains to run
+        step_num : int
+            Number of iterations to sample over in each chain
+        sample_period : int
+            How frequently to record samples
+        sample_burnin : int
+            Interations before recording in each chain
+        random_order : bool
+            Where to update Parameters in a random order
+        seed : int
+            Seed from which the random streams of all chains are derived
+        processes : int
+            Number of worker processes - defaults to the number of CPUs.
+            If set to 1, chains are run one after another in this process
+        initial_values : list
+            Optional list of dictionaries (one per chain), giving the
+            starting value of any parameters that should differ between chains
+        output_path : str
+            If this is specified, each chain is streamed to the subdirectory
+            `chain_<i>` of this directory instead of being held in memory
+        block_size : int
+            Number of samples held in memory between writes to `output_path`
+        checkpoint_path : str
+            If this is specified, each chain is checkpointed to the file
+            `chain_<i>.pkl` in this directory, which can be continued
+            separately with `MixedSampler.resume`
+        checkpoint_interval : int
+            Number of iterations between checkpoints
+        instrument : bool
+            Whether to record timing and acceptance statistics for each chain
+        target_acceptance : float
+            If this is specified, the step sizes of Metropolis parameters are
+            tuned towards this acceptance rate over the burn-in of each chain
+
+        Returns
+        -------
+        pd.DataFrame : Samples from all chains, with the chain number
+            recorded in the `Chain` column. If `output_path` is given, a
+            list of ChainRecorder objects (one per chain) is returned instead.
+            If `instrument` is set, a tuple of this and a list of
+            SamplerStats (one per chain)
+        """
+        seed_seqs = np.random.SeedSequence(seed).spawn(chain_num)
+        initial_values = initial_values or [{}] * chain_num
+        kwargs = {'step_num': step_num, 'sample_period': sample_period,
+                  'sample_burnin': sample_burnin, 'random_order': random_order,
+                  'block_size': block_size, 'checkpoint_interval': checkpoint_interval,
+                  'instrument': instrument, 'target_acceptance': target_acceptance}
+        if checkpoint_path is not None:
+            os.makedirs(checkpoint_path, exist_ok=True)
+        jobs = []
+        for i in range(chain_num):
+            chain_kwargs = dict(kwargs)
+            if output_path is not None:
+                chain_kwargs['output_path'] = os.path.join(output_path, f"chain_{i}")
+            if checkpoint_path is not None:
+                chain_kwargs['checkpoint_path'] = os.path.join(checkpoint_path, f"chain_{i}.pkl")
+            jobs.append((self.params, seed_seqs[i], i, chain_kwargs, initial_values[i]))
+
+        if processes == 1:
+            outputs = [_run_chain(copy.deepcopy(params), *args)
+                       for params, *args in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                outputs = list(executor.map(_run_chain, *zip(*jobs)))
+
+        if instrument:
+            outputs, stats = map(list, zip(*outputs))
+        if output_path is None:
+            outputs = pd.concat(outputs, ignore_index=True)
+        if instrument:
+            return outputs, stats
+        return outputs
+
+
+def _run_chain(params, seed_seq, chain_num, kwargs, initial_values):
+    """Runs a single chain of `MixedSampler.multi_chain_routine`, with all
+    randomness derived from the given seed sequence."""
+    rng = np.random.default_rng(seed_seq)
+    # Any draws outside the sampler's generator (e.g. in custom
+    # conditionals or proposals) are also seeded per chain
+    np.random.seed(seed_seq.generate_state(1))
+    random.seed(int(seed_seq.generate_state(1)[0]))
+
+    sampler = MixedSampler(params, rng=rng)
+    for key, value in initial_values.items():
+        sampler.params.set_value(key, value)
+    return sampler.sampling_routine(chain_num=chain_num, display_progress=False, **kwargs)
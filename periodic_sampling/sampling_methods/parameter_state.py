@@ -0,0 +1,525 @@
+#
+# Array-backed storage for sampler parameters
+#
+
+import inspect
+import re
+import numpy as np
+from collections.abc import Mapping, MutableMapping
+from functools import lru_cache
+
+
+_INDEXED_KEY = re.compile(r'^(.+)_(\d+)$')
+
+
+def _is_parameter(value):
+    """Parameter objects (Gibbs or Metropolis) are identified by their
+    sampling frequency, to avoid importing the sampler classes here."""
+    return hasattr(value, 'sampling_freq')
+
+
+def _is_block(value):
+    """Parameters holding an array of values, one per index of a family."""
+    return _is_parameter(value) and np.ndim(value.value) == 1
+
+
+@lru_cache(maxsize=None)
+def _keyword_arguments(func):
+    """Names of the keyword arguments of a conditional, or None if it
+    accepts arbitrary keyword arguments (and so is passed every value)."""
+    try:
+        signature = inspect.signature(func)
+    except (TypeError, ValueError):
+        return None
+    names = []
+    for argument in signature.parameters.values():
+        if argument.kind is inspect.Parameter.VAR_KEYWORD:
+            return None
+        if argument.kind in (inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                             inspect.Parameter.KEYWORD_ONLY):
+            names.append(argument.name)
+    return tuple(names)
+
+
+class StoredParameter:
+    """Base class for parameter objects (Gibbs or Metropolis). Once a
+    parameter is added to a ParameterState its value is held in the storage
+    of that state (e.g. the family array for indexed keys) rather than on
+    the parameter, so the two never disagree and no copies are made.
+    """
+    __slots__ = ('_value', '_state', '_key')
+
+    def __init__(self, value):
+        self._value = value
+        self._state = None
+        self._key = None
+
+    @property
+    def value(self):
+        """Current value of the parameter"""
+        if self._state is None:
+            return self._value
+        return self._state._value(self._key)
+
+    @value.setter
+    def value(self, value):
+        if self._state is None:
+            self._value = value
+        else:
+            self._state.set_value(self._key, value)
+
+    def _bind(self, state, key):
+        """Reads and writes the value from the storage of a state."""
+        self._state, self._key = state, key
+
+    def _unbind(self):
+        """Keeps the current value on the parameter, once removed from a state."""
+        self._value = self.value
+        self._state = self._key = None
+
+    def __float__(self):
+        return float(self.value)
+
+
+class ParameterValues(Mapping):
+    """Read-only live view of the current values of a parameter mapping,
+    with Parameter objects replaced by their values. Nothing is copied -
+    each lookup reads the underlying storage - so conditionals can index
+    the view on every update at no cost proportional to the number of
+    parameters.
+    """
+    __slots__ = ('_params',)
+
+    def __init__(self, params):
+        self._params = params
+
+    def __getitem__(self, key):
+        value = self._params[key]
+        return value.value if _is_parameter(value) else value
+
+    def __iter__(self):
+        return iter(self._params)
+
+    def __len__(self):
+        return len(self._params)
+
+    def __contains__(self, key):
+        return key in self._params
+
+    def arguments(self, func):
+        """Keyword arguments for a conditional, read from the view. Only the
+        named arguments of the function are looked up, unless it accepts
+        arbitrary keyword arguments (`**kwargs`), when every value is passed.
+
+        Parameters
+        ----------
+        func : func
+            Function object to be called with the current values
+
+        Returns
+        -------
+        dict : Mapping of argument name to current value
+        """
+        names = self.argument_names(func)
+        if names is None:
+            return dict(self)
+        return {name: self[name] for name in names}
+
+    def argument_names(self, func):
+        """Names of the arguments of a conditional found in the view, or
+        None if it accepts arbitrary keyword arguments (`**kwargs`).
+
+        Parameters
+        ----------
+        func : func
+            Function object to be called with the current values
+
+        Returns
+        -------
+        tuple : Names of the arguments read from the view
+        """
+        names = _keyword_arguments(func)
+        if names is None:
+            return None
+        return tuple(name for name in names if name in self._params)
+
+
+def current_values(params):
+    """Live view of the current values of a ParameterState or dictionary.
+
+    Parameters
+    ----------
+    params : Dict or ParameterState
+        Mapping of all parameters + constants
+
+    Returns
+    -------
+    ParameterValues : Read-only view of the current values
+    """
+    if isinstance(params, ParameterState):
+        return params.view
+    return ParameterValues(params)
+
+
+class ParameterState(MutableMapping):
+    """Store of all parameter values used by the samplers.
+
+    Keys of the form '<family>_<index>' (e.g. 'data_12', 'truth_12', 'R_12',
+    'bias_3') are held in one contiguous NumPy array per family, so that
+    conditionals can read `state.truth[i]` or slice `state.data[3::7]`
+    directly instead of scanning string keys. All other keys are kept as
+    constants. Indices of a family without a key of their own take the value
+    of the closest lower key, so a piecewise-constant family (such as `R_0`
+    and `R_50` under `constant_r_parameter`) reads correctly at every index.
+
+    A parameter whose value is an array (such as a GibbsBlock) may instead
+    be stored under a family name (e.g. 'R'), and then holds every index of
+    that family.
+
+    The state also behaves as the dictionary it was built from - indexing
+    by name returns the Parameter object for sampled parameters and the
+    stored value otherwise - so existing conditionals written against the
+    dict layout keep working.
+
+    `view` is a read-only live view of the current values (with Parameter
+    objects replaced by their values), and Parameter objects in the state
+    read their values from its storage.
+
+    Quantities derived from the state can be stored with `cache`, and kept
+    up to date by registering a callback for the families they depend on
+    with `subscribe`. Caches are dropped whenever keys are added or removed.
+    """
+
+    def __init__(self, families=None, constants=None, parameters=None):
+        """Constructor method for the parameter state.
+
+        Parameters
+        ----------
+        families : dict
+            Mapping of family name to array of values, one per index
+        constants : dict
+            Mapping of key to value for all non-indexed entries
+        parameters : dict
+            Mapping of key to Parameter object for all sampled entries.
+            Keys of the form '<family>_<index>' are stored in that family
+        """
+        self.families = {}
+        self.constants = {}
+        self.parameters = {}
+        self._slots = {}  # key -> (family, index)
+        self._bounds = {}  # family -> {index: end of the segment set by this key}
+        self._blocks = set()  # keys of parameters holding a whole family
+        self._order = []
+        self._caches = {}
+        self._listeners = {}  # family -> list of callbacks
+        self._versions = {}  # key -> number of times it has been written
+        self.rng = None  # np.random.Generator, if not using the global random state
+        self.stats = None  # SamplerStats, if the sampling routine is instrumented
+        self.view = ParameterValues(self)
+
+        for family, values in (families or {}).items():
+            self.families[family] = np.asarray(values).copy()
+            for index in range(len(values)):
+                key = f"{family}_{index}"
+                self._slots[key] = (family, index)
+                self._order.append(key)
+            self._update_bounds(family)
+        for key, value in (constants or {}).items():
+            self[key] = value
+        for key, param in (parameters or {}).items():
+            self[key] = param
+
+    @classmethod
+    def from_params(cls, params):
+        """Builds a state from a dictionary in the layout used by the
+        workflows (e.g. `{'data_0': 12, 'truth_0': GibbsParameter(...)}`).
+        States are returned unchanged, so samplers can call this on any input.
+
+        Parameters
+        ----------
+        params : Dict
+            Dictionary of all parameters + constants required for
+            calculating conditional posterior distributions.
+
+        Returns
+        -------
+        ParameterState : State holding the same keys and values
+        """
+        if isinstance(params, ParameterState):
+            return params
+
+        grouped = {}
+        state = cls()
+        for key, value in params.items():
+            match = _INDEXED_KEY.match(key)
+            if _is_block(value):
+                state.families[key] = np.array(value.value, dtype=float)
+                state._blocks.add(key)
+            elif match is None:
+                state.constants[key] = value.value if _is_parameter(value) else value
+            else:
+                family, index = match.group(1), int(match.group(2))
+                grouped.setdefault(family, {})[index] = value
+                state._slots[key] = (family, index)
+            if _is_parameter(value):
+                state.parameters[key] = value
+            state._order.append(key)
+
+        for family, entries in grouped.items():
+            values = {i: (v.value if _is_parameter(v) else v) for i, v in entries.items()}
+            state.families[family] = cls._fill_family(values)
+            state._update_bounds(family)
+        for key, param in state.parameters.items():
+            param._bind(state, key)
+        return state
+
+    @staticmethod
+    def _fill_family(values):
+        """Array over all indices up to the largest key, filling gaps
+        from the closest lower key."""
+        length = max(values) + 1
+        integer = all(isinstance(v, (int, np.integer)) for v in values.values())
+        if integer and len(values) == length:
+            return np.array([values[i] for i in range(length)], dtype=np.int64)
+        array = np.full(length, np.nan)
+        current = np.nan
+        for i in range(length):
+            current = values.get(i, current)
+            array[i] = current
+        return array
+
+    def _update_bounds(self, family):
+        """Recompute the segment of the family array set by each key."""
+        indices = sorted(i for f, i in self._slots.values() if f == family)
+        stops = indices[1:] + [len(self.families[family])]
+        self._bounds[family] = dict(zip(indices, stops))
+
+    def __getattr__(self, name):
+        families = self.__dict__.get('families', {})
+        if name in families:
+            return families[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def __getitem__(self, key):
+        if key in self.parameters:
+            return self.parameters[key]
+        return self._value(key)
+
+    def _value(self, key):
+        """Current value stored for a key."""
+        slot = self._slots.get(key)
+        if slot is not None:
+            return self.families[slot[0]][slot[1]].item()
+        if key in self._blocks:
+            return self.families[key]
+        return self.constants[key]
+
+    def __setitem__(self, key, value):
+        self._versions[key] = self._versions.get(key, 0) + 1
+        if key in self._blocks or _is_block(value):
+            if key not in self._blocks:
+                self._order.append(key)
+                self._blocks.add(key)
+                self.families[key] = np.array(value.value, dtype=float)
+                self._clear_caches()
+            param = value if _is_parameter(value) else None
+            self._release(key, param)
+            self._write_family(key, value.value if param is not None else value)
+            self._adopt(key, param)
+            return
+        if key not in self._slots and key not in self.constants:
+            self._add_key(key)
+        param = value if _is_parameter(value) else None
+        self._release(key, param)
+        if param is not None:
+            value = param.value
+        if key in self._slots:
+            self._write(key, value)
+        else:
+            self.constants[key] = value
+        self._adopt(key, param)
+
+    def _release(self, key, param):
+        """Detaches the parameter held under a key, unless it is `param`."""
+        current = self.parameters.get(key)
+        if current is not None and current is not param:
+            del self.parameters[key]
+            current._unbind()
+
+    def _adopt(self, key, param):
+        """Stores a parameter under a key, reading its value from the state."""
+        if param is not None:
+            self.parameters[key] = param
+            param._bind(self, key)
+
+    def __delitem__(self, key):
+        if key not in self._order:
+            raise KeyError(key)
+        self._versions[key] = self._versions.get(key, 0) + 1
+        self._release(key, None)
+        self._order.remove(key)
+        self.constants.pop(key, None)
+        if key in self._blocks:
+            self._blocks.discard(key)
+            del self.families[key]
+            self._clear_caches()
+        slot = self._slots.pop(key, None)
+        if slot is not None:
+            self._update_bounds(slot[0])
+            self._clear_caches()
+
+    def __iter__(self):
+        return iter(self._order)
+
+    def __len__(self):
+        return len(self._order)
+
+    def __contains__(self, key):
+        return key in self._slots or key in self.constants or key in self._blocks
+
+    def _add_key(self, key):
+        """Registers a new key, extending the family array if required."""
+        self._order.append(key)
+        match = _INDEXED_KEY.match(key)
+        if match is None:
+            return
+        family, index = match.group(1), int(match.group(2))
+        self._slots[key] = (family, index)
+        array = self.families.get(family, np.zeros(0, dtype=np.int64))
+        if index >= len(array):
+            fill = array[-1] if len(array) else np.nan
+            extension = np.full(index + 1 - len(array), fill)
+            array = np.concatenate([array, extension])
+        self.families[family] = array
+        self._update_bounds(family)
+        self._clear_caches()
+
+    def _write(self, key, value):
+        """Writes a value into the family array over the segment of the key."""
+        family, index = self._slots[key]
+        array = self.families[family]
+        if (np.issubdtype(array.dtype, np.integer)
+                and not float(value).is_integer()):
+            array = self.families[family] = array.astype(float)
+        stop = self._bounds[family][index]
+        listeners = self._listeners.get(family)
+        if listeners:
+            old = array[index:stop].copy()
+            array[index:stop] = value
+            for callback in listeners:
+                callback(index, stop, old)
+        else:
+            array[index:stop] = value
+
+    def _write_family(self, family, values):
+        """Overwrites every value of a family, as in a block update."""
+        array = self.families[family]
+        listeners = self._listeners.get(family)
+        old = array.copy() if listeners else None
+        array[:] = values
+        for callback in listeners or []:
+            callback(0, len(array), old)
+
+    def _clear_caches(self):
+        """Drops all derived quantities, which may no longer match the shape
+        of the family arrays."""
+        self._caches.clear()
+        self._listeners.clear()
+
+    def random_generator(self):
+        """Source of randomness for sampling from this state: the state's own
+        `rng` if one has been set, otherwise NumPy's global random state (as
+        seeded by `np.random.seed`).
+
+        Returns
+        -------
+        np.random.Generator or np.random.RandomState : Random number generator
+        """
+        if self.rng is not None:
+            return self.rng
+        return np.random.mtrand._rand
+
+    def cache(self, name, factory):
+        """Returns a named quantity derived from the state, creating it
+        on first use.
+
+        Parameters
+        ----------
+        name : str
+            Name under which the quantity is stored
+        factory : func
+            Function object that creates the quantity if it is not yet cached
+
+        Returns
+        -------
+        object : The cached quantity
+        """
+        if name not in self._caches:
+            self._caches[name] = factory()
+        return self._caches[name]
+
+    def subscribe(self, family, callback):
+        """Registers a callback to run whenever values in a family change.
+
+        Parameters
+        ----------
+        family : str
+            Name of the family to watch (e.g. 'truth')
+        callback : func
+            Called as `callback(start, stop, old)` after the values at indices
+            [start, stop) are overwritten, where `old` holds the previous values
+        """
+        self._listeners.setdefault(family, []).append(callback)
+
+    def set_value(self, key, value):
+        """Records a newly sampled value for a named parameter in the
+        storage of the state (which the Parameter object reads from).
+
+        Parameters
+        ----------
+        key : str
+            Name of the parameter to update
+        value : float
+            New value of the parameter
+        """
+        self._versions[key] = self._versions.get(key, 0) + 1
+        if key in self._slots:
+            self._write(key, value)
+        elif key in self._blocks:
+            self._write_family(key, value)
+        else:
+            self.constants[key] = value
+
+    def versions(self, keys):
+        """Number of times each of the given keys has been written, so that
+        quantities computed from their values can tell if they are stale.
+
+        Parameters
+        ----------
+        keys : iterable
+            Names of the keys to check
+
+        Returns
+        -------
+        tuple : Write count of each key
+        """
+        return tuple(self._versions.get(key, 0) for key in keys)
+
+    def labelled(self, key, value):
+        """Labels a sampled value for recording, splitting the values of a
+        block into their indexed names.
+
+        Parameters
+        ----------
+        key : str
+            Name of the sampled parameter
+        value : float or np.ndarray
+            Value returned by the sampler
+
+        Returns
+        -------
+        dict : Mapping of recorded name to value
+        """
+        if key in self._blocks:
+            return {f"{key}_{i}": v for i, v in enumerate(value)}
+        return {key: value}
@@ -0,0 +1,102 @@
+#
+# Instrumentation of the sampling routines
+#
+
+import re
+import pandas as pd
+
+
+_INDEXED_KEY = re.compile(r'^(.+)_(\d+)$')
+
+
+class SamplerStats:
+    """Record of where time is spent in a sampling routine. Tracks the wall
+    time and number of updates of each parameter family (e.g. all 'truth_'
+    keys together), the number of likelihood evaluations made by each family,
+    and the acceptance rate of each Metropolis parameter.
+
+    Recording only adds a few dictionary updates per parameter update, so
+    can be left enabled in long runs.
+    """
+
+    def __init__(self):
+        """Constructor method for an empty record."""
+        self.time = {}
+        self.calls = {}
+        self.likelihood_evaluations = {}
+        self.proposals = {}
+        self.accepted = {}
+
+    @staticmethod
+    def family(key):
+        """Family of a parameter name, e.g. 'truth' for 'truth_12'."""
+        match = _INDEXED_KEY.match(key)
+        return key if match is None else match.group(1)
+
+    def record_sample(self, key, seconds):
+        """Records one update of a named parameter.
+
+        Parameters
+        ----------
+        key : str
+            Name of the parameter updated
+        seconds : float
+            Wall time taken by the update
+        """
+        family = self.family(key)
+        self.time[family] = self.time.get(family, 0.0) + seconds
+        self.calls[family] = self.calls.get(family, 0) + 1
+
+    def record_likelihood(self, key, count = 1):
+        """Records evaluations of the likelihood for a named parameter.
+
+        Parameters
+        ----------
+        key : str
+            Name of the parameter being updated
+        count : int
+            Number of evaluations (e.g. one per candidate value)
+        """
+        family = self.family(key)
+        self.likelihood_evaluations[family] = self.likelihood_evaluations.get(family, 0) + count
+
+    def record_acceptance(self, key, accepted, proposals = 1):
+        """Records the outcome of Metropolis proposals.
+
+        Parameters
+        ----------
+        key : str
+            Name of the parameter being updated
+        accepted : bool or int
+            Whether the proposed value was accepted, or the number of
+            accepted components of a block proposal
+        proposals : int
+            Number of proposals made (e.g. one per component of a block)
+        """
+        self.proposals[key] = self.proposals.get(key, 0) + proposals
+        self.accepted[key] = self.accepted.get(key, 0) + int(accepted)
+
+    def acceptance_rate(self):
+        """Fraction of proposals accepted for each Metropolis parameter.
+
+        Returns
+        -------
+        dict : Mapping of parameter name to acceptance rate
+        """
+        return {key: self.accepted[key] / n for key, n in self.proposals.items()}
+
+    def summary(self):
+        """Table of time, updates and likelihood evaluations per family.
+
+        Returns
+        -------
+        pd.DataFrame : One row per parameter family, ordered by total time
+        """
+        families = list(dict.fromkeys(list(self.time) + list(self.likelihood_evaluations)))
+        summary = pd.DataFrame({'time': [self.time.get(f, 0.0) for f in families],
+                                'calls': [self.calls.get(f, 0) for f in families],
+                                'likelihood_evaluations': [self.likelihood_evaluations.get(f, 0)
+                                                           for f in families]},
+                               index=pd.Index(families, name='family'))
+        summary['time_per_call'] = summary['time'] / summary['calls'].where(summary['calls'] > 0)
+        return summary.sort_values('time', ascending=False)
@@ -4,4 +4,5 @@
 
 
 from .biased_reporter import Reporter
-from .renewal_model import RenewalModel
\ No newline at end of file
+from .renewal_model import RenewalModel
+from .serial_registry import cumulative_normalisation, serial_interval
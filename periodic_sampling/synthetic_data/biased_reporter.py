@@ -2,10 +2,19 @@
 # Class to report case data with periodic biases
 #
 
-import math
 import numpy as np
 import scipy.stats as ss
-from datetime import datetime, timedelta
+from datetime import datetime
+
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday',
+            'Friday', 'Saturday', 'Sunday']
+
+
+def _weekday_index(dates):
+    """Index of the weekday (Monday = 0) of each date in an array"""
+    days = np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+    return (days + 3) % 7  # 01/01/1970 was a Thursday
 
 
 class Reporter():
@@ -31,8 +40,9 @@ class Reporter():
         self.start_date = datetime.strptime(start_date, "%d/%m/%Y").date()
         self.fatality_rate = fatality_rate
 
-        self.case_data['Date'] = self.case_data.apply(lambda row: self.start_date 
-                                    + timedelta(days=int(row.name)), axis=1)
+        offsets = np.asarray(self.case_data.index, dtype=np.int64).astype('timedelta64[D]')
+        dates = np.datetime64(self.start_date, 'D') + offsets
+        self.case_data['Date'] = dates.astype(object)  # As datetime.date objects
 
     def unbiased_report(self, output_path=None, df=None):
         """Save data to .csv format at 'output_path' compatible with
@@ -53,8 +63,9 @@ class Reporter():
         
         if 'Confirmed' not in df.columns:
             df.rename(columns={'Cases': 'Confirmed'}, inplace=True)
-        df['Deaths'] = df['Confirmed'].apply(lambda x: math.floor(x * self.fatality_rate
-                                                                  + np.random.uniform()))
+        confirmed = df['Confirmed'].to_numpy(dtype=float)
+        df['Deaths'] = np.floor(confirmed * self.fatality_rate
+                                + np.random.uniform(size=len(confirmed))).astype(np.int64)
         if output_path is not None:
             df.to_csv(output_path)
         else:
@@ -86,9 +97,8 @@ class Reporter():
         """
         df = self.case_data.copy()
 
-        weekdays = ['Monday', 'Tuesday', 'Wednesday', 'Thursday',
-                    'Friday', 'Saturday', 'Sunday']
-        df['Weekday'] = df['Date'].apply(lambda x: weekdays[x.weekday()])
+        weekday_index = _weekday_index(df['Date'])
+        df['Weekday'] = np.array(WEEKDAYS, dtype=object)[weekday_index]
         
         if bias is None:  # Default values from analysis
             bias = [1.3, 1.2, 1, 1, 1, 0.9, 0.6]
@@ -96,20 +106,20 @@ class Reporter():
             assert len(bias) == 7, 'Expected seven values for weekday bias'
             temp_dict = {}
             for i, value in enumerate(bias):
-                temp_dict[weekdays[i]] = value
+                temp_dict[WEEKDAYS[i]] = value
                 bias = temp_dict  # Can now overwrite list values
         elif isinstance(bias, dict):
-            assert set(weekdays) == set(bias.keys), 'Keys must match weekdays'
+            assert set(WEEKDAYS) == set(bias.keys), 'Keys must match weekdays'
 
         normalisation = sum(bias.values())
         for v in bias.values():
             v /= normalisation
 
+        factors = np.array([bias[day] for day in WEEKDAYS])[weekday_index]
         if method == 'scale':
-            df['Confirmed'] = df.apply(lambda row: int(row['Cases']
-                                       * bias[row['Weekday']]), axis=1)
+            df['Confirmed'] = (df['Cases'].to_numpy() * factors).astype(np.int64)
         elif method == 'poisson':
-            df['Confirmed'] = df.apply(lambda row: ss.poisson.rvs(row['Cases'] * bias[row['Weekday']]), axis=1)
+            df['Confirmed'] = ss.poisson.rvs(df['Cases'].to_numpy() * factors)
         elif method == 'multinomial':
             df['Confirmed'] = self._rolling_multinomial(df, bias)
         elif method == 'dirichlet':
@@ -125,9 +135,17 @@ class Reporter():
         if output_path is None:
             return df
 
+    def _week_weights(self, df, bias):
+        """Bias weights for each day of a 7-day period, starting from
+        the weekday of the first date in the dataframe."""
+        weights = np.array(list(bias.values())) / 7
+        first_day_index = _weekday_index(df['Date'][:1])[0]
+        return weights[(np.arange(7) + first_day_index) % 7]
+
     def _rolling_multinomial(self, df, bias):
         """For each period of 7 days, redistributes the total number
-        of cases according to the bias values.
+        of cases according to the bias values. All weeks are drawn
+        together, as a sequence of binomial draws for each weekday.
 
         Parameters
         df : pandas.Dataframe
@@ -135,17 +153,21 @@ class Reporter():
         bias : list
             List of fixed weights to use for multinomial distribution
         """
-        data = list(df['Cases'].copy())
-        weights = [i / 7 for i in bias.values()]
+        data = df['Cases'].to_numpy().copy()
+        weights = self._week_weights(df, bias)
         week_count = len(data) // 7
 
-        first_day_index = df['Date'][0].weekday()
-        weights = [weights[(i+first_day_index) % 7] for i in range(7)]
-
-        for w in range(week_count):
-            week_data = data[7*w : 7*(w + 1)]
-            day_counts = np.random.multinomial(sum(week_data), weights)
-            data[7*w : 7*(w + 1)] = day_counts
+        remaining = data[:7 * week_count].reshape(week_count, 7).sum(axis=1)
+        day_counts = np.zeros((week_count, 7), dtype=np.int64)
+        mass = 1.0  # Probability not yet allocated to earlier weekdays
+        for i in range(6):
+            p = min(max(weights[i] / mass, 0.0), 1.0) if mass > 0 else 0.0
+            day_counts[:, i] = np.random.binomial(remaining, p)
+            remaining = remaining - day_counts[:, i]
+            mass -= weights[i]
+        day_counts[:, 6] = remaining  # Final weekday takes all remaining cases
+
+        data[:7 * week_count] = day_counts.ravel()
         return data
 
     def _rolling_dirichlet(self, df, bias):
@@ -161,17 +183,13 @@ class Reporter():
         bias : list
             List of fixed weights to use for Dirichlet distribution
         """
-        data = list(df['Cases'].copy())
-        weights = [i / 7 for i in bias.values()]
+        data = df['Cases'].to_numpy().astype(float)
+        weights = self._week_weights(df, bias)
         week_count = len(data) // 7
 
-        first_day_index = df['Date'][0].weekday()
-        weights = [weights[(i+first_day_index) % 7] for i in range(7)]
-
-        for w in range(week_count):
-            week_data = data[7*w : 7*(w + 1)]
-            rf = np.random.dirichlet(weights)
-            data[7*w : 7*(w + 1)] = [week_data[i] * (7 * rf[i]) for i in range(7)]
+        rf = np.random.dirichlet(weights, size=week_count)  # One row per week
+        week_data = data[:7 * week_count].reshape(week_count, 7)
+        data[:7 * week_count] = (week_data * (7 * rf)).ravel()
         return data
 
     def delay_distribution_report(self, params, output_path=None):
@@ -192,20 +210,19 @@ class Reporter():
         """
 
         df = self.case_data.copy()
-        case_data = list(df['Cases'])
-
-        for i, value in enumerate(list(df['Cases'].copy())):
-            day_index = df['Date'][i].weekday()
-            delay_values = self._discrete_gamma_delay(value, params['shape'][day_index],
-                                                     params['rate'][day_index])
-
-            # Update case-data with new counts
-            case_data[i] -= sum(delay_values)
-            for j, d_value in enumerate(delay_values):
-                try:
-                    case_data[i + j] += d_value
-                except IndexError:  # Occurs at end of dataset
-                    continue
+        cases = df['Cases'].to_numpy()
+        series_len = len(cases)
+
+        # Expected number of cases from each day reported on each of the following
+        # seven days (including the original day), with stochastic rounding
+        kernels = self._gamma_delay_kernels(params['shape'], params['rate'])
+        expected = kernels[_weekday_index(df['Date'])] * cases[:, np.newaxis]
+        delay_values = np.floor(expected + np.random.uniform(size=expected.shape)).astype(np.int64)
+
+        # Update case-data with new counts, dropping any delayed beyond the end of the dataset
+        case_data = cases - delay_values.sum(axis=1)
+        for j in range(7):
+            case_data[j:] += delay_values[:series_len - j, j]
  
         df['Confirmed'] = case_data
         df.rename(columns={'Cases': 'Ground Truth'}, inplace=True)
@@ -214,22 +231,24 @@ class Reporter():
         if output_path is None:
             return df
 
-    def _discrete_gamma_delay(self, value, shape, rate):
-        """Takes a value of cases on a given day, and returns the 
-        reported number of cases on each day in the next week (including
-        the original day) based on a discrete gamma distribution, 
-        with stochastic rounding.
+    @staticmethod
+    def _gamma_delay_kernels(shape, rate):
+        """Returns the fraction of cases from a given weekday that are
+        reported on each day in the next week (including the original day),
+        based on a discrete gamma distribution for each weekday.
         
         Parameters
         ----------
-        value : int
-            Number of cases on a given day to redistribute
-        shape : float 
-            Shape parameter for gamma parameter used in redistribution
-        rate : float
-            Rate parameter for gamma parameter used in redistribution
+        shape : list
+            Shape parameter of the gamma distribution for each weekday
+        rate : list
+            Rate parameter of the gamma distribution for each weekday
+
+        Returns
+        -------
+        np.ndarray : Array of shape (7, 7), with one row per weekday
         """
-        unnorm_dist = ss.gamma.pdf(x=list(range(7)), a=shape, scale=1/rate)
-        data_bias = (unnorm_dist / (sum(unnorm_dist))) * value
-        return [math.floor(x + np.random.uniform()) for x in data_bias]
-
+        shape = np.asarray(shape, dtype=float)[:, np.newaxis]
+        rate = np.asarray(rate, dtype=float)[:, np.newaxis]
+        unnorm_dist = ss.gamma.pdf(x=np.arange(7), a=shape, scale=1/rate)
+        return unnorm_dist / unnorm_dist.sum(axis=1, keepdims=True)
@@ -6,10 +6,11 @@ import os
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
-import scipy.stats as ss
 import matplotlib.pyplot as plt
 plt.rcParams['font.size'] = '12'
 
+from .serial_registry import serial_interval
+
 
 class RenewalModel():
     """Simulator class for a Renewal Model"""
@@ -44,15 +45,17 @@ class RenewalModel():
 
         Returns
         -------
-        list : Discrete probability distribution for the serial interval
+        np.ndarray : Discrete probability distribution for the serial interval,
+            shared (read-only) between all models with the same parameters
         """
-        dist = ss.lognorm(s=np.log(sigma), scale=mu)
-        unnorm_values = dist.pdf(range(days))
-        return unnorm_values / sum(unnorm_values)
+        return serial_interval(mu=mu, sigma=sigma, days=days)
         
-    def simulate(self, T, N_0, display_progress = True, R_0 = None):
+    def simulate(self, T, N_0, display_progress = True, R_0 = None, rng = None):
         """Simulate renewal model over T steps, with N_0 initial cases.
         Excludes original value due to incomplete history.
+
+        Recent case numbers are held in a fixed-size buffer, so that lambda
+        at each step is a single dot product with the reversed serial interval.
         
         Parameters
         ----------
@@ -65,26 +68,113 @@ class RenewalModel():
         R_0 : list or float
             Can overwrite previous value of R_0 specified, or provide time-depedant 
             R_0 values in the form of a list with one element per timestep (N_0 total)
+        rng : np.random.Generator
+            Random number generator for the case numbers - if not given, NumPy's
+            global random state is used (as set by `np.random.seed`)
         """
         self.t_max = T
         self.N_0 = N_0
 
         if R_0 is None:
             R_0 = self.reproduction_num
+        R_0 = self._r_schedule(R_0, T)
+        rng = np.random.mtrand._rand if rng is None else rng
 
-        if isinstance(R_0, (int, float)):
-            R_0 = [R_0] * T  # Convert to list format
+        omega = np.asarray(self.serial_interval, dtype=float)
+        weights = omega[:0:-1]  # omega[n-1], ..., omega[1], to pair with oldest case first
+        history_len = len(weights)
+
+        # Each case is written twice, so the last `history_len` cases are always
+        # the contiguous slice buffer[pos + 1 : pos + 1 + history_len]
+        buffer = np.zeros(2 * history_len)
+        buffer[history_len - 1] = buffer[-1] = N_0 / omega[1]  # Scale N_0 to account for missing history
+        pos = history_len - 1
+
+        cases = np.zeros(T, dtype=np.int64)
+        for t in tqdm(range(1, T + 1), disable = not display_progress):
+            lambda_val = np.dot(weights, buffer[pos + 1 : pos + 1 + history_len])
+            cases[t - 1] = rng.poisson(R_0[t-1] * lambda_val)
+            pos = (pos + 1) % history_len
+            buffer[pos] = buffer[pos + history_len] = cases[t - 1]
+        self.case_data = pd.DataFrame(cases, columns = ['Cases'])
+
+    def simulate_ensemble(self, n_trajectories, T, N_0, R_0 = None, rng = None,
+                          display_progress = True, long_format = False):
+        """Simulate an ensemble of independent renewal model trajectories,
+        stepping all trajectories forward together. Each trajectory is
+        simulated as in `simulate`.
+
+        Parameters
+        ----------
+        n_trajectories : int
+            Number of trajectories to simulate
+        T : int
+            Number of steps (days) to simulate
+        N_0 : int or array_like
+            Number of initial cases, either shared or one per trajectory
+        R_0 : float, list or array_like
+            Reproductive number - a single value, a list with one element per
+            timestep (shared by all trajectories), or an array of shape
+            (n_trajectories, T) giving a separate schedule for each trajectory
+        rng : np.random.Generator
+            Random number generator for the case numbers - if not given, NumPy's
+            global random state is used (as set by `np.random.seed`)
+        display_progress : bool
+            Whether to display the tqdm progress bar
+        long_format : bool
+            Whether to return a long dataframe (with columns 'Trajectory',
+            'Day' and 'Cases') instead of an array
+
+        Returns
+        -------
+        np.ndarray or pd.DataFrame : Cases of shape (n_trajectories, T), or
+            in long format
+        """
+        self.t_max = T
+        self.N_0 = N_0
+
+        if R_0 is None:
+            R_0 = self.reproduction_num
+        if np.ndim(R_0) == 2:
+            R_0 = np.asarray(R_0, dtype=float)
+            assert R_0.shape == (n_trajectories, T), \
+                "Array of R_0 values must be of shape (n_trajectories, T)"
         else:
-            assert isinstance(R_0, list), "Unsupported format of R_0 - must be float or list"
-            assert len(R_0) == T, "List of R_0 values must be of length T"
+            R_0 = np.broadcast_to(self._r_schedule(R_0, T), (n_trajectories, T))
+        rng = np.random.mtrand._rand if rng is None else rng
+
+        omega = np.asarray(self.serial_interval, dtype=float)
+        weights = omega[:0:-1]  # omega[n-1], ..., omega[1], to pair with oldest case first
+        history_len = len(weights)
+
+        # As in `simulate`, with one row of the buffer per trajectory
+        buffer = np.zeros((n_trajectories, 2 * history_len))
+        initial = np.broadcast_to(np.asarray(N_0, dtype=float), (n_trajectories,))
+        buffer[:, history_len - 1] = buffer[:, -1] = initial / omega[1]
+        pos = history_len - 1
 
-        omega = self.serial_interval
-        cases = [N_0 / omega[1]]  # Scale N_0 to account for missing history
+        cases = np.zeros((n_trajectories, T), dtype=np.int64)
         for t in tqdm(range(1, T + 1), disable = not display_progress):
-            n_terms_lambda = min(t + 1, len(omega))  # Number of terms in sum for lambda
-            lambda_val = sum([omega[i] * cases[-i] for i in range(1, n_terms_lambda)])
-            cases.append(np.random.poisson(R_0[t-1] * lambda_val))
-        self.case_data = pd.DataFrame(cases[1:], columns = ['Cases'])
+            lambda_vals = buffer[:, pos + 1 : pos + 1 + history_len] @ weights
+            cases[:, t - 1] = rng.poisson(R_0[:, t-1] * lambda_vals)
+            pos = (pos + 1) % history_len
+            buffer[:, pos] = buffer[:, pos + history_len] = cases[:, t - 1]
+        self.ensemble_data = cases
+
+        if long_format:
+            return pd.DataFrame({'Trajectory': np.repeat(np.arange(n_trajectories), T),
+                                 'Day': np.tile(np.arange(T), n_trajectories),
+                                 'Cases': cases.ravel()})
+        return cases
+
+    @staticmethod
+    def _r_schedule(R_0, T):
+        """Array of R_0 values at each timestep, from a single value or a list."""
+        if isinstance(R_0, (int, float)):
+            return np.full(T, float(R_0))  # Constant over all timesteps
+        assert isinstance(R_0, list), "Unsupported format of R_0 - must be float or list"
+        assert len(R_0) == T, "List of R_0 values must be of length T"
+        return np.asarray(R_0, dtype=float)
 
     def plot(self, save_loc = None):
         """Plot case data over time.
@@ -0,0 +1,64 @@
+#
+# Shared registry of discrete serial interval distributions
+#
+
+import functools
+import numpy as np
+import scipy.stats as ss
+
+
+def _read_only(values):
+    """Copy of an array that cannot be modified, so it is safe to share"""
+    array = np.array(values, dtype=float)
+    array.flags.writeable = False
+    return array
+
+@functools.lru_cache(maxsize=None)
+def _serial_interval(mu, sigma, days):
+    dist = ss.lognorm(s=np.log(sigma), scale=mu)
+    unnorm_values = dist.pdf(range(days))
+    return _read_only(unnorm_values / sum(unnorm_values))
+
+def serial_interval(mu = 4.7, sigma = 2.9, days = 20):
+    """Discrete serial interval distribution, based on a continuous
+    lognormal distribution. Each distribution is computed once and the
+    same (read-only) array is returned on every later call.
+
+    Default parameter values taken from Nishiura et al. (2020)
+    https://doi.org/10.1016/j.ijid.2020.02.060.
+
+    Parameters
+    ----------
+    mu : float
+        Mean of the lognormal distribution generating the serial interval
+    sigma : float
+        Standard deviation of the lognormal dist for the serial interval
+    days : int
+        Cutoff duration of serial interval
+
+    Returns
+    -------
+    np.ndarray : Discrete probability distribution for the serial interval
+    """
+    return _serial_interval(float(mu), float(sigma), int(days))  # Key by value, not call style
+
+@functools.lru_cache(maxsize=None)
+def _cumulative_from_bytes(omega_bytes):
+    return _read_only(np.cumsum(np.frombuffer(omega_bytes)))
+
+def cumulative_normalisation(omega):
+    """Cumulative sums of a serial interval, where entry t is the total
+    weight of the first t + 1 values. Used to renormalise the serial interval
+    when it is truncated (i.e. for lambda at max_t < len(omega)). Tables
+    are computed once for each distinct serial interval.
+
+    Parameters
+    ----------
+    omega : array_like
+        Discrete serial interval distribution
+
+    Returns
+    -------
+    np.ndarray : Read-only array of cumulative sums of omega
+    """
+    return _cumulative_from_bytes(np.asarray(omega, dtype=float).tobytes())
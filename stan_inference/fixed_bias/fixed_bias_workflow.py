@@ -4,7 +4,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 plt.rcParams['font.size'] = '14'
 
-from periodic_sampling.synthetic_data import RenewalModel, Reporter
+from periodic_sampling.synthetic_data import RenewalModel, Reporter, serial_interval
 
 # Simulate Renewal Model
 time_steps = 100; N_0 = 100; seed=41; R0 = 0.99
@@ -31,7 +31,7 @@ fixed_bias_data = {
     "time_steps": len(c_val),
     "C": c_val,
     "R": 0.99,
-    "serial_interval": RenewalModel(R0=None).serial_interval,
+    "serial_interval": serial_interval(),
     "alpha_prior": [1 for _ in range(7)]  # larger val -> tighter dist
 }
 
@@ -2,7 +2,7 @@ import stan
 import numpy as np
 import pandas as pd
 
-from periodic_sampling.synthetic_data import RenewalModel, Reporter
+from periodic_sampling.synthetic_data import RenewalModel, Reporter, serial_interval
 
 # Used for smoothing stepped R profile
 
@@ -38,7 +38,7 @@ fixed_bias_data = {
     "time_steps": len(c_val),
     "C": c_val,
     "Rt_window": 2,
-    "serial_interval": RenewalModel(R0=None).serial_interval,
+    "serial_interval": serial_interval(),
     "alpha_prior": [1 for _ in range(7)]  # larger val -> tighter dist
 }
 
@@ -6,7 +6,7 @@ import scipy.stats as ss
 import matplotlib.pyplot as plt
 plt.rcParams['font.size'] = '14'
 
-from periodic_sampling.synthetic_data import RenewalModel, Reporter
+from periodic_sampling.synthetic_data import RenewalModel, Reporter, serial_interval
 
 # Simulate Renewal Model
 time_steps = 100; N_0 = 100; seed=41; R0_diff = 0.2
@@ -34,7 +34,7 @@ fixed_bias_data = {
     "time_steps": len(c_val),
     "C": c_val,
     "Rt_window": 7,
-    "serial_interval": RenewalModel(R0=None).serial_interval,
+    "serial_interval": serial_interval(),
     "alpha_prior": [1 for _ in range(7)]  # larger val -> tighter dist
 }
 